@@ -2,7 +2,7 @@
 import ui
 import threading
 from time import sleep
-from WowWeeMip import Mip
+from WowWeeMip import Mip, Animation
 
 # Disconnect on exit
 class MyView (ui.View):
@@ -72,6 +72,8 @@ class Handler(object):
   def __init__(self,v):
     self.v = v
     self.l=[1,1,1,1]
+    # stream the chest led colour without blocking the ui
+    self.player = Animation.Player(fps=10)
     # create robot
     #self.ro=Mip()
     # set self as delegate object, see on_event() method
@@ -113,9 +115,8 @@ class Handler(object):
     b = v['blue'].value
     # Create the new color from the slider values:
     v['chestled'].background_color = (r, g, b)
-    # Change the chest color
-    Mip.setChestLed(int(255*r),int(255*g),int(255*b))
-    sleep(.1)
+    # Change the chest color, the player drops colours the link can't keep up with
+    self.player.show((int(255*r),int(255*g),int(255*b)))
 
   # Handle eye buttons and update mip head leds
   def button_action(self,sender):
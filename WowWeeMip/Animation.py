@@ -0,0 +1,196 @@
+# coding: utf-8
+"""
+WowWeeMip chest led animations
+_________________________________________
+use:
+from WowWeeMip import Mip, Animation
+
+player = Animation.Player(fps=25)
+player.play(Animation.fade('#ff0000', '#0000ff', 2.0), loop=True)
+player.play(Animation.hsvCycle(5.0))
+player.play(Animation.keyframes([(0,'#000000'), (0.5,'#ffffff'), (1.5,'#000000')]))
+player.show('#00ff00')       # latest colour wins, for sliders
+player.stop()
+
+_________________________________________
+The frames are computed up front as (n,3) uint8 numpy arrays. The
+player picks the frame for the elapsed time, so when the link falls
+behind frames are skipped instead of queued, and a frame equal to the
+one already shown is not written again.
+"""
+
+import threading
+import logging
+
+import numpy as np
+
+from . import Mip
+
+FPS = 25
+
+
+def color(c):
+  '''
+  color(c)
+  Return: numpy array [r, g, b] from '#rrggbb' or (r, g, b)
+  '''
+  if isinstance(c, basestring):
+    c = (int(c[1:3],16), int(c[3:5],16), int(c[5:7],16))
+  return np.array(c, dtype=np.float64)
+
+def _frames(rgb):
+  return np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+
+def gradient(colors, n):
+  '''
+  gradient(colors, n)
+  n frames going through the colours at equal distances
+  '''
+  stops = np.array([color(c) for c in colors])
+  x = np.linspace(0, len(stops)-1, n)
+  return _frames(np.column_stack([np.interp(x, np.arange(len(stops)), stops[:,i]) for i in range(3)]))
+
+def fade(start, end, duration, fps=FPS):
+  '''
+  fade(start, end, duration, fps=25)
+  Linear fade between two colours in duration seconds
+  '''
+  return gradient([start, end], max(int(duration*fps), 2))
+
+def pulse(c, period, fps=FPS, low=0.0):
+  '''
+  pulse(c, period, fps=25, low=0.0)
+  One sine period of brightness between low and 1
+  '''
+  n = max(int(period*fps), 2)
+  level = low+(1-low)*(0.5-0.5*np.cos(np.linspace(0, 2*np.pi, n, endpoint=False)))
+  return _frames(np.outer(level, color(c)))
+
+def hsvCycle(duration, fps=FPS, s=1.0, v=1.0):
+  '''
+  hsvCycle(duration, fps=25, s=1.0, v=1.0)
+  One turn of the hue wheel in duration seconds
+  '''
+  n = max(int(duration*fps), 2)
+  h = np.linspace(0, 6, n, endpoint=False)
+  i = np.floor(h).astype(int)
+  f = h-i
+  p = np.full(n, v*(1-s))
+  q = v*(1-s*f)
+  t = v*(1-s*(1-f))
+  vv = np.full(n, v)
+  r = np.choose(i, [vv, q, p, p, t, vv])
+  g = np.choose(i, [t, vv, vv, q, p, p])
+  b = np.choose(i, [p, p, t, vv, vv, q])
+  return _frames(255*np.column_stack([r, g, b]))
+
+def keyframes(track, fps=FPS):
+  '''
+  keyframes(track, fps=25)
+  Interpolate a list of (time, colour) pairs sorted by time
+  '''
+  times = np.array([float(t) for t, c in track])
+  stops = np.array([color(c) for t, c in track])
+  x = times[0]+np.arange(max(int((times[-1]-times[0])*fps), 1)+1)/float(fps)
+  return _frames(np.column_stack([np.interp(x, times, stops[:,i]) for i in range(3)]))
+
+
+class Player(object):
+
+  def __init__(self, manager=None, fps=FPS, maxRate=None):
+    self.log = logging.getLogger('Animation')
+    self.manager = manager or Mip._manager
+    self.fps = fps
+    self.interval = 1.0/(maxRate or fps)
+    self.cv = threading.Condition()
+    self.frames = None
+    self.loop = False
+    self.start = 0
+    self.last = -1
+    self.running = True
+    self.counters = dict.fromkeys(['written', 'skipped', 'unchanged'], 0)
+    self.written = float('-inf')
+    #frames are written by a worker of the manager's clock
+    self.worker = self.manager.clock.worker(self._step)
+
+  def play(self, frames, loop=False):
+    '''
+    play(frames, loop=False)
+    Replace the current animation
+    '''
+    with self.cv:
+      self.frames = np.asarray(frames, dtype=np.uint8).reshape(-1, 3)
+      self.loop = loop
+      self.start = self.manager.clock.time()
+      self.last = -1
+      self.cv.notifyAll()
+    self.worker.wake()
+
+  def show(self, c):
+    '''
+    show(c)
+    Set one colour, a colour not written yet is replaced by the next one
+    '''
+    self.play(_frames(color(c)).reshape(1, 3))
+
+  def playing(self):
+    with self.cv:
+      return self.frames is not None
+
+  def stop(self):
+    '''
+    stop()
+    Stop the animation, the led keeps the last colour
+    '''
+    with self.cv:
+      self.frames = None
+      self.cv.notifyAll()
+    self.worker.wake()
+
+  def close(self):
+    with self.cv:
+      self.frames = None
+      self.running = False
+      self.cv.notifyAll()
+    self.worker.stop()
+
+  def stats(self):
+    with self.cv:
+      return dict(self.counters)
+
+  def _step(self):
+    #return: seconds until the next frame or None when idle
+    clock = self.manager.clock
+    with self.cv:
+      if not self.running or self.frames is None:
+        return
+      gap = self.written+self.interval-clock.time()
+      if gap>0:
+        #rate limit, a newer colour can replace the frame meanwhile
+        return gap
+      n = len(self.frames)
+      #a clock stepped to the frame time can land just before it
+      i = int((clock.time()-self.start)*self.fps+1e-6)
+      if self.last>=0 and i<=self.last:
+        return (self.last+1)/float(self.fps)-(clock.time()-self.start)
+      if i>=n and not self.loop:
+        i = n-1
+        self.frames, frames = None, self.frames
+      else:
+        frames = self.frames
+        if self.last>=0 and i>self.last+1:
+          self.counters['skipped'] += i-self.last-1
+        self.last = i
+      rgb = tuple(int(v) for v in frames[i%n])
+      state = self.manager.state
+      if rgb == state.chestLed and state.flash is None:
+        self.counters['unchanged'] += 1
+        rgb = None
+      else:
+        self.counters['written'] += 1
+    if rgb is not None:
+      self.manager.setChestLed(*rgb)
+      self.written = clock.time()
+    with self.cv:
+      if self.frames is not None:
+        return max((self.last+1)/float(self.fps)-(clock.time()-self.start), 0)
@@ -0,0 +1,243 @@
+# coding: utf-8
+"""
+WowWeeMip fleet controller, the same command on many MiP robots
+_________________________________________
+use:
+from WowWeeMip import Mip, Fleet
+
+def on_event(robot,event,data):  # robot is the peripheral uuid
+    pass
+
+fleet = Fleet.Fleet(on_event)
+fleet.connect(count=3)
+fleet.calibrate()
+report = fleet.broadcast('playSound', [Mip.sound.beep,0], delay=0.5)
+fleet.broadcast('setChestLed', 255, 0, 0)
+fleet.disconnect()
+
+_________________________________________
+A command is encoded once and written to every robot from its own
+thread. With `at` (a fleet.clock.time() timestamp) or `delay` every write is
+issued ahead of the shared time by the one way latency of its link,
+estimated by calibrate() from read round trips. The commands are written
+with response, and the report has the arrival skew in seconds of every
+robot against that time, measured from the acknowledgements. With
+confirm=False the writes are without response and the skew is only
+estimated from the issue times.
+"""
+
+import cb
+import threading
+import logging
+
+from . import Mip
+
+
+class Fleet(object):
+
+  def __init__(self, handler=None, clock=None):
+    self.log = logging.getLogger('Fleet')
+    self.handler = handler
+    self.clock = clock or Mip.Clock()
+    self.robots = {}
+    self.latency = {}
+    self.count = 0
+
+  #------- central delegate --------
+
+  def _robot(self, c):
+    #robot owning a service or characteristic
+    for robot in self.robots.values():
+      if c is robot.read_c or c is robot.write_c or c == robot.read_c or c == robot.write_c:
+        return robot
+      if robot.peripheral and c in (robot.peripheral.services or []):
+        return robot
+
+  def did_discover_peripheral(self, p):
+    if not (p.name and 'WowWee-MiP' in p.name) or p.uuid in self.robots:
+      return
+    if len(self.robots)>=self.count:
+      return
+    self.log.info('Connecting to %s %s', p.name, p.uuid)
+    robot = Mip._Manager(lambda event,data,uuid=p.uuid: self.on_event(uuid,event,data))
+    robot.exclusive = False
+    robot.clock = self.clock
+    robot.peripheral = p
+    self.robots[p.uuid] = robot
+    cb.connect_peripheral(p)
+
+  def did_connect_peripheral(self, p):
+    if p.uuid in self.robots:
+      self.robots[p.uuid].did_connect_peripheral(p)
+
+  def did_fail_to_connect_peripheral(self, p, error):
+    robot = self.robots.pop(p.uuid, None)
+    if robot:
+      robot.did_fail_to_connect_peripheral(p, error)
+
+  def did_disconnect_peripheral(self, p, error):
+    robot = self.robots.pop(p.uuid, None)
+    if robot:
+      robot.did_disconnect_peripheral(p, error)
+
+  def did_discover_services(self, p, error):
+    if p.uuid in self.robots:
+      self.robots[p.uuid].did_discover_services(p, error)
+
+  def did_discover_characteristics(self, s, error):
+    robot = self._robot(s)
+    if robot:
+      robot.did_discover_characteristics(s, error)
+
+  def did_read_rssi(self, p, rssi, error):
+    if p.uuid in self.robots:
+      self.robots[p.uuid].did_read_rssi(p, rssi, error)
+
+  def did_write_value(self, c, error):
+    robot = self._robot(c)
+    if robot:
+      robot.did_write_value(c, error)
+
+  def did_update_value(self, c, error):
+    robot = self._robot(c)
+    if robot:
+      robot.did_update_value(c, error)
+
+  def on_event(self, robot, event, data):
+    self.log.info('on_event %s %s %s', robot, event, data)
+    if self.handler:
+      self.handler(robot, event, data)
+
+  #------- fleet --------
+
+  def connect(self, count=2, timeout=15):
+    '''
+    connect(count=2, timeout=15)
+    Connect with up to count robots
+    Return: the number of connected robots
+    '''
+    self.log.info('connect %d', count)
+    self.count = count
+    cb.set_central_delegate(self)
+    end = self.clock.time()+timeout
+    cb.scan_for_peripherals()
+    while len(self.connected())<count and self.clock.time()<end:
+      self.clock.sleep(0.1)
+    cb.stop_scan()
+    for uuid, robot in self.robots.items():
+      if not robot.ready:
+        self.log.warning('%s did not connect', uuid)
+        self.robots.pop(uuid)
+        cb.cancel_peripheral_connection(robot.peripheral)
+    return len(self.robots)
+
+  def connected(self):
+    '''
+    connected()
+    Return: list of the uuids of the ready robots
+    '''
+    return [uuid for uuid, robot in self.robots.items() if robot.ready]
+
+  def disconnect(self):
+    '''
+    disconnect()
+    Disconnect every robot
+    '''
+    self.log.info('disconnect')
+    robots = self.robots.values()
+    threads = [threading.Thread(target=robot.disconnect, args=()) for robot in robots]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.robots = {}
+    self.latency = {}
+    cb.reset()
+
+  def calibrate(self, samples=5):
+    '''
+    calibrate(samples=5)
+    Estimate the one way latency of every link as half of the
+    fastest volume read round trip
+    Return: dictionary {uuid: seconds}
+    '''
+    for uuid, robot in self.robots.items():
+      best = None
+      for i in range(samples):
+        t = self.clock.time()
+        if type(robot.read([Mip.attribute.volume])) is dict:
+          rtt = self.clock.time()-t
+          best = rtt if best is None else min(best, rtt)
+      if best is None:
+        self.log.warning('%s did not answer', uuid)
+      else:
+        self.latency[uuid] = best/2
+    self.log.info('latency %s', self.latency)
+    return dict(self.latency)
+
+  def broadcast(self, command, *args, **kwargs):
+    '''
+    broadcast(command, *args, at=None, delay=None, confirm=True)
+    Send a _Manager command to every connected robot at the same time
+    at: fleet.clock.time() timestamp, delay: seconds from now
+    confirm: write with response and measure the skew from the
+    acknowledgement times, minus the calibrated latency
+    Return: dictionary {'target':t, 'skew':{uuid: seconds}, 'spread':seconds,
+    'confirmed':confirm, 'estimate':{uuid: seconds}, 'failed':[uuid]}
+    skew is the estimate when confirm is False, a robot whose write
+    failed is left out of skew and spread
+    fleet.broadcast('distanceDrive', 20, 0, delay=0.3)
+    '''
+    at = kwargs.get('at')
+    delay = kwargs.get('delay')
+    confirm = kwargs.get('confirm', True)
+    messages = Mip.encode(command, *args)
+    robots = [(uuid, robot) for uuid, robot in self.robots.items() if robot.ready]
+    if not robots or not messages:
+      return {'target':None, 'skew':{}, 'spread':0.0, 'confirmed':confirm, 'estimate':{}, 'failed':[]}
+    if at is None and delay is not None:
+      at = self.clock.time()+delay
+    go = threading.Event()
+    written = {}
+    acknowledged = {}
+
+    def write(uuid, robot):
+      latency = self.latency.get(uuid, 0.0)
+      go.wait()
+      if at is not None:
+        fire = at-latency
+        while True:
+          left = fire-self.clock.time()
+          if left<=0:
+            break
+          self.clock.sleep(left/2 if left>0.002 else left)
+      t = self.clock.time()
+      if not confirm:
+        for message in messages:
+          robot.peripheral.write_characteristic_value(robot.write_c, message, False)
+        written[uuid] = t+latency
+        return
+      def acked(w):
+        #the acknowledgement comes back one latency after the arrival
+        if w.ok:
+          acknowledged[uuid] = self.clock.time()-latency
+      writes = [robot.sendReliable(list(bytearray(message))) for message in messages[:-1]]
+      writes.append(robot.sendReliable(list(bytearray(messages[-1])), acked))
+      written[uuid] = t+latency
+      writes[-1].wait(robot.writeTimeout*(robot.retries+1)+1)
+
+    threads = [threading.Thread(target=write, args=r) for r in robots]
+    for thread in threads:
+      thread.daemon = True
+      thread.start()
+    go.set()
+    for thread in threads:
+      thread.join()
+    target = at if at is not None else min(written.values())
+    estimate = dict((uuid, t-target) for uuid, t in written.items())
+    skew = dict((uuid, t-target) for uuid, t in acknowledged.items()) if confirm else estimate
+    failed = [uuid for uuid, robot in robots if uuid not in skew]
+    spread = max(skew.values())-min(skew.values()) if skew else 0.0
+    report = {'target':target, 'skew':skew, 'spread':spread, 'confirmed':confirm, 'estimate':estimate, 'failed':failed}
+    self.log.info('broadcast %s %s', command, report)
+    return report
@@ -0,0 +1,351 @@
+# coding: utf-8
+"""
+WowWeeMip gateway, many TCP clients sharing one MiP connection
+_________________________________________
+use:
+from WowWeeMip import Mip, Gateway
+
+Mip.connect()
+gateway = Gateway.Gateway(port=9000)
+gateway.start()
+...
+gateway.stop()
+
+_________________________________________
+Clients send one JSON object per line and get one JSON object per line:
+
+{"id":1, "cmd":"setChestLed", "args":[255,0,0], "priority":0}
+{"id":2, "get":133}          -> {"id":2, "ok":true, "value":{"meters":1.2}}
+{"id":3, "subscribe":true}   -> then {"event":"radar", "data":{...}} lines
+{"id":4, "stats":true}       -> queue depth and latencies of every client
+
+Commands are encoded with Mip.encode() and written by one thread. Each
+client has its own queue per priority, the highest priority is served
+first and clients with the same priority are served round robin. stop
+has the highest priority and drops the queued drive commands. Reads of
+the same attribute requested while one is pending are answered by a
+single read.
+
+Every client has a bounded outbox written by its own sender thread, so
+a slow client never blocks the notifications or the other clients. When
+the outbox is full events are dropped, and a client that cannot take a
+reply is disconnected, it stays in stats() as disconnected.
+"""
+
+import json
+import socket
+import threading
+import logging
+import SocketServer
+from collections import deque
+
+from . import Mip
+
+STOP_PRIORITY = 10
+commands = ['playSound', 'setMipPosition', 'distanceDrive', 'driveWithTime', 'turnByAngle', 'stop', 'continuousDrive',
+  'setGameMode', 'mipGetUp', 'setChestLed', 'flashChestLed', 'setHeadLed', 'setMipVolume', 'setRadarMode',
+  'sendIrCode', 'setIrReceive']
+drive = ['distanceDrive', 'driveWithTime', 'turnByAngle', 'continuousDrive']
+
+
+class _Client(object):
+
+  def __init__(self, gateway, sock, address):
+    self.gateway = gateway
+    self.sock = sock
+    self.address = address
+    self.name = '%s:%d' % address[:2]
+    self.queues = {}
+    self.subscribed = False
+    self.outbox = deque()
+    self.cv = threading.Condition()
+    self.closed = False
+    self.overflow = False
+    self.counters = dict.fromkeys(['commands', 'reads', 'dropped', 'errors', 'eventsDropped'], 0)
+    self.latency = 0.0
+    self.maxLatency = 0.0
+    self.thread = threading.Thread(target=self._sender, args=())
+    self.thread.daemon = True
+
+  def reply(self, message):
+    #never blocks, called from the BLE delegate and with the gateway lock held
+    with self.cv:
+      if self.closed:
+        return
+      if len(self.outbox)>=self.gateway.outbox:
+        if 'event' in message:
+          self.counters['eventsDropped'] += 1
+          return
+        self.overflow = True
+      else:
+        self.outbox.append(message)
+        self.cv.notifyAll()
+        return
+    self.gateway.log.warning('%s outbox full, disconnected', self.name)
+    self.close()
+    try:
+      self.sock.shutdown(socket.SHUT_RDWR)
+    except socket.error:
+      pass
+
+  def close(self):
+    with self.cv:
+      self.closed = True
+      self.cv.notifyAll()
+
+  def _sender(self):
+    while True:
+      with self.cv:
+        while not self.closed and not self.outbox:
+          self.cv.wait(1)
+        if self.closed:
+          return
+        message = self.outbox.popleft()
+      try:
+        self.sock.sendall(json.dumps(message)+'\n')
+      except socket.error as err:
+        self.gateway.log.info('%s send failed: %s', self.name, err)
+        self.close()
+
+  def depth(self):
+    return sum(len(q) for q in self.queues.values())
+
+  def stats(self):
+    s = dict(self.counters)
+    s['queued'] = self.depth()
+    s['outbox'] = len(self.outbox)
+    s['latency'] = self.latency
+    s['maxLatency'] = self.maxLatency
+    s['subscribed'] = self.subscribed
+    s['disconnected'] = self.overflow
+    return s
+
+
+class _Handler(SocketServer.StreamRequestHandler):
+
+  def handle(self):
+    gateway = self.server.gateway
+    client = _Client(gateway, self.request, self.client_address)
+    gateway._add(client)
+    try:
+      for line in iter(self.rfile.readline, ''):
+        line = line.strip()
+        if line:
+          gateway._request(client, line)
+    except socket.error as err:
+      #also the shutdown of a client with a full outbox
+      gateway.log.info('%s closed: %s', client.name, err)
+    finally:
+      gateway._remove(client)
+
+
+class _Server(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+
+class Gateway(object):
+
+  def __init__(self, host='127.0.0.1', port=9000, manager=None, outbox=256):
+    self.log = logging.getLogger('Gateway')
+    self.host = host
+    self.port = port
+    self.manager = manager or Mip._manager
+    self.outbox = outbox
+    self.clients = []
+    self.overflowed = []
+    self.cv = threading.Condition()
+    self.reads = {}
+    self.readorder = deque()
+    self.turn = 0
+    self.running = False
+    self.server = None
+    self.threads = []
+
+  def start(self):
+    '''
+    start()
+    Listen for clients and start the writer and reader threads
+    '''
+    self.log.info('start %s:%d', self.host, self.port)
+    self.server = _Server((self.host, self.port), _Handler)
+    self.server.gateway = self
+    self.port = self.server.server_address[1]
+    self.running = True
+    self.manager.addListener(self._publish)
+    self.threads = [threading.Thread(target=f, args=()) for f in (self.server.serve_forever, self._writer, self._reader)]
+    for thread in self.threads:
+      thread.daemon = True
+      thread.start()
+
+  def stop(self):
+    '''
+    stop()
+    Close the server and every client
+    '''
+    self.log.info('stop')
+    with self.cv:
+      self.running = False
+      self.cv.notifyAll()
+    self.manager.removeListener(self._publish)
+    self.server.shutdown()
+    self.server.server_close()
+    for client in list(self.clients):
+      try:
+        client.sock.shutdown(socket.SHUT_RDWR)
+      except socket.error:
+        pass
+    for thread in self.threads:
+      thread.join()
+    self.threads = []
+
+  def stats(self):
+    '''
+    stats()
+    Return: dictionary {client: {'queued', 'outbox', 'commands', 'reads', 'dropped', 'errors',
+    'eventsDropped', 'latency', 'maxLatency', 'disconnected'}}, the clients disconnected
+    for a full outbox are kept with disconnected True
+    '''
+    with self.cv:
+      return dict((c.name, c.stats()) for c in self.overflowed+self.clients)
+
+  #------- clients --------
+
+  def _add(self, client):
+    self.log.info('client %s connected', client.name)
+    with self.cv:
+      self.clients.append(client)
+    client.thread.start()
+
+  def _remove(self, client):
+    self.log.info('client %s disconnected', client.name)
+    client.close()
+    with self.cv:
+      self.clients.remove(client)
+      if client.overflow:
+        self.overflowed = self.overflowed[-15:]+[client]
+      for waiters in self.reads.values():
+        waiters[:] = [w for w in waiters if w[0] is not client]
+
+  def _request(self, client, line):
+    try:
+      request = json.loads(line)
+      rid = request.get('id')
+    except (ValueError, AttributeError):
+      client.counters['errors'] += 1
+      client.reply({'ok':False, 'error':'invalid request'})
+      return
+    if 'cmd' in request:
+      self._command(client, rid, request)
+    elif 'get' in request:
+      self._get(client, rid, request['get'])
+    elif 'subscribe' in request:
+      client.subscribed = bool(request['subscribe'])
+      client.reply({'id':rid, 'ok':True})
+    elif 'stats' in request:
+      client.reply({'id':rid, 'ok':True, 'stats':self.stats()})
+    else:
+      client.counters['errors'] += 1
+      client.reply({'id':rid, 'ok':False, 'error':'unknown request'})
+
+  def _command(self, client, rid, request):
+    cmd = request['cmd']
+    if cmd not in commands:
+      client.counters['errors'] += 1
+      client.reply({'id':rid, 'ok':False, 'error':'unknown command %s' % cmd})
+      return
+    try:
+      priority = STOP_PRIORITY if cmd == 'stop' else min(max(int(request.get('priority', 0)), 0), STOP_PRIORITY-1)
+      messages = Mip.encode(cmd, *request.get('args', []))
+    except Exception as err:
+      client.counters['errors'] += 1
+      client.reply({'id':rid, 'ok':False, 'error':str(err)})
+      return
+    with self.cv:
+      if cmd == 'stop':
+        self._cancelDrive()
+      client.queues.setdefault(priority, deque()).append((rid, cmd, messages, self.manager.clock.time()))
+      self.cv.notifyAll()
+
+  def _cancelDrive(self):
+    for c in self.clients:
+      for q in c.queues.values():
+        kept = deque()
+        for item in q:
+          if item[1] in drive:
+            c.counters['dropped'] += 1
+            c.reply({'id':item[0], 'ok':False, 'error':'cancelled by stop'})
+          else:
+            kept.append(item)
+        q.clear()
+        q.extend(kept)
+
+  def _get(self, client, rid, attribute):
+    if type(attribute) is not int or attribute not in Mip._Manager.events:
+      client.counters['errors'] += 1
+      client.reply({'id':rid, 'ok':False, 'error':'%s is not a valid attribute' % attribute})
+      return
+    with self.cv:
+      client.counters['reads'] += 1
+      if attribute not in self.reads:
+        self.reads[attribute] = []
+        self.readorder.append(attribute)
+      self.reads[attribute].append((client, rid))
+      self.cv.notifyAll()
+
+  def _publish(self, event, data):
+    with self.cv:
+      subscribers = [c for c in self.clients if c.subscribed]
+    for c in subscribers:
+      c.reply({'event':event, 'data':data})
+    return False
+
+  #------- link threads --------
+
+  def _next(self):
+    #highest priority first, round robin between the clients
+    best = None
+    n = len(self.clients)
+    for i in range(n):
+      c = self.clients[(self.turn+i)%n]
+      for priority, q in c.queues.items():
+        if q and (best is None or priority>best[1]):
+          best = (c, priority, i)
+    if best is None:
+      return None, None
+    c, priority, i = best
+    self.turn = (self.turn+i+1)%n
+    return c, c.queues[priority].popleft()
+
+  def _writer(self):
+    while True:
+      with self.cv:
+        while self.running and not any(c.depth() for c in self.clients):
+          self.cv.wait(1)
+        if not self.running:
+          return
+        client, (rid, cmd, messages, queued) = self._next()
+      for message in messages:
+        self.manager.send(bytearray(message))
+      latency = self.manager.clock.time()-queued
+      client.counters['commands'] += 1
+      client.latency = latency if client.counters['commands'] == 1 else 0.9*client.latency+0.1*latency
+      client.maxLatency = max(client.maxLatency, latency)
+      client.reply({'id':rid, 'ok':self.manager.ready})
+
+  def _reader(self):
+    while True:
+      with self.cv:
+        while self.running and not self.readorder:
+          self.cv.wait(1)
+        if not self.running:
+          return
+        attribute = self.readorder[0]
+      value = self.manager.read([attribute])
+      if type(value) is not dict:
+        value = None
+      with self.cv:
+        self.readorder.popleft()
+        waiters = self.reads.pop(attribute)
+      for client, rid in waiters:
+        client.reply({'id':rid, 'ok':value is not None, 'value':value})
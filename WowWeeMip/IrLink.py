@@ -0,0 +1,330 @@
+# coding: utf-8
+"""
+WowWeeMip IR data link between two MiP robots
+_________________________________________
+use:
+from WowWeeMip import Mip, IrLink
+
+def on_message(data):      # called with the list of bytes of every message
+    pass
+
+Mip.connect()
+link = IrLink.IrLink(on_message)
+link.start()
+link.send([1,2,3,4,5,6,7])
+print link.stats()
+link.stop()
+
+_________________________________________
+Every IR code carries one 4 byte frame:
+
+byte 0: kind (2 bits) and sequence number (6 bits)
+byte 1-3: payload
+
+A message is its length byte followed by the payload, split in 3 byte
+fragments. The first fragment is sent as START, the rest as CONT and
+every received fragment is acknowledged with an ACK frame carrying its
+sequence number. Up to `window` fragments are in flight, unacknowledged
+fragments are sent again after `timeout` seconds and fragments that
+were already received are acknowledged again but not delivered twice.
+
+start() opens a session with a SYN frame carrying a random 3 byte
+session id, no fragment is sent before it is acknowledged. A receiver
+seeing a new session id restarts its sequence at the SYN, so a link or
+robot restarted while the other one kept running is not taken for
+duplicates.
+
+The link runs as a worker of the manager's clock, set it with
+Mip.setClock() before start().
+"""
+
+import random
+import threading
+import logging
+from collections import deque
+
+from . import Mip
+
+START, CONT, ACK, SYN = 0, 1, 2, 3
+SEQ = 64
+PAYLOAD = 3
+
+
+class IrLink(object):
+
+  def __init__(self, handler=None, manager=None, window=8, interval=0.15, timeout=1.0, power=120):
+    self.log = logging.getLogger('IrLink')
+    if window<1 or window>SEQ/2:
+      raise ValueError('window must be 1-%d' % (SEQ/2))
+    self.handler = handler
+    self.manager = manager or Mip._manager
+    self.window = window
+    self.interval = interval
+    self.timeout = timeout
+    self.power = power
+    self.cv = threading.Condition()
+    self.running = False
+    self.worker = None
+    self._reset()
+
+  def _reset(self):
+    #sender
+    self.queue = deque()
+    self.inflight = {}
+    self.nextseq = 0
+    self.base = 0
+    self.remaining = {}
+    self.acks = deque()
+    self.session = [random.randint(0, 255) for i in range(PAYLOAD)]
+    self.queue.append((None, SYN, self.session))
+    self.synced = False
+    self.nextframe = None
+    #receiver
+    self.peer = None
+    self.rcvbase = 0
+    self.received = {}
+    self.message = None
+    self.messageid = 0
+    self.rtt = None
+    self.counters = dict.fromkeys(['framesSent', 'framesRetransmitted', 'framesReceived', 'duplicates',
+      'acksSent', 'acksReceived', 'messagesSent', 'messagesDelivered', 'messagesReceived',
+      'bytesDelivered', 'bytesReceived', 'sessions'], 0)
+    self.started = self.manager.clock.time()
+
+  def start(self):
+    '''
+    start()
+    Enable IR receive and start the link
+    '''
+    self.log.info('start')
+    with self.cv:
+      if self.running:
+        return
+      self._reset()
+      self.running = True
+    self.manager.addListener(self.on_event)
+    self.manager.setIrReceive(True)
+    self.worker = self.manager.clock.worker(self._step)
+
+  def stop(self):
+    '''
+    stop()
+    Stop the link, frames not yet acknowledged are dropped
+    '''
+    self.log.info('stop')
+    with self.cv:
+      self.running = False
+      self.cv.notifyAll()
+    self.manager.removeListener(self.on_event)
+    if self.worker:
+      self.worker.stop()
+      self.worker = None
+
+  def send(self, data):
+    '''
+    send(data)
+    Queue a message of 0-255 bytes
+    Return: the message id
+    '''
+    data = [b%256 for b in data]
+    if len(data)>255:
+      raise ValueError('message is %d bytes, the limit is 255' % len(data))
+    raw = [len(data)]+data
+    raw += [0]*(-len(raw)%PAYLOAD)
+    with self.cv:
+      self.messageid += 1
+      mid = self.messageid
+      fragments = [raw[i:i+PAYLOAD] for i in range(0, len(raw), PAYLOAD)]
+      for i,fragment in enumerate(fragments):
+        self.queue.append((mid, START if i == 0 else CONT, fragment))
+      self.remaining[mid] = [len(fragments), len(data)]
+      self.counters['messagesSent'] += 1
+      self.cv.notifyAll()
+    self._wake()
+    self.log.info('send message %d, %d fragments', mid, len(fragments))
+    return mid
+
+  def pending(self):
+    '''
+    pending()
+    Return: number of fragments queued or not yet acknowledged
+    '''
+    with self.cv:
+      return len(self.queue)+len(self.inflight)
+
+  def flush(self, timeout=None):
+    '''
+    flush(timeout=None)
+    Wait until every queued fragment is acknowledged
+    Return: True or False on timeout
+    '''
+    clock = self.manager.clock
+    end = None if timeout is None else clock.time()+timeout
+    with self.cv:
+      while self.running and (self.queue or self.inflight):
+        if end is not None:
+          if clock.time()>=end:
+            break
+          #a virtual clock runs the link while waiting, the acks notify
+          clock.wait(self.cv, min(end-clock.time(), 1))
+        else:
+          clock.wait(self.cv, 1)
+      return not (self.queue or self.inflight)
+
+  def stats(self):
+    '''
+    stats()
+    Return: dictionary with the counters, smoothed round trip time,
+    throughput in bytes/s and the retransmitted fraction of the frames
+    '''
+    with self.cv:
+      s = dict(self.counters)
+      elapsed = max(self.manager.clock.time()-self.started, 1e-6)
+      s['rtt'] = self.rtt
+      s['inflight'] = len(self.inflight)
+      s['queued'] = len(self.queue)
+      s['txThroughput'] = s['bytesDelivered']/elapsed
+      s['rxThroughput'] = s['bytesReceived']/elapsed
+      s['loss'] = float(s['framesRetransmitted'])/s['framesSent'] if s['framesSent'] else 0.0
+    return s
+
+  #------- frames --------
+
+  def on_event(self, event, data):
+    if event != 'irCode':
+      return False
+    code = data['irCode']
+    if len(code)<1+PAYLOAD:
+      return False
+    kind, seq = code[0]>>6, code[0]&(SEQ-1)
+    if kind == ACK:
+      self._on_ack(seq)
+    else:
+      self._on_frame(kind, seq, code[1:1+PAYLOAD])
+    return True
+
+  def _on_ack(self, seq):
+    with self.cv:
+      self.counters['acksReceived'] += 1
+      frame = self.inflight.pop(seq, None)
+      if frame is None:
+        return
+      mid, kind, payload, sent, tries = frame
+      if tries == 1:
+        rtt = self.manager.clock.time()-sent
+        self.rtt = rtt if self.rtt is None else 0.875*self.rtt+0.125*rtt
+      if kind == SYN:
+        self.synced = True
+      elif self.remaining[mid][0] == 1:
+        self.counters['messagesDelivered'] += 1
+        self.counters['bytesDelivered'] += self.remaining.pop(mid)[1]
+      else:
+        self.remaining[mid][0] -= 1
+      while self.base != self.nextseq and self.base not in self.inflight:
+        self.base = (self.base+1)%SEQ
+      self.cv.notifyAll()
+    self._wake()
+
+  def _on_frame(self, kind, seq, payload):
+    messages = []
+    with self.cv:
+      self.counters['framesReceived'] += 1
+      self.acks.append(seq)
+      if kind == SYN and payload != self.peer:
+        #new session, the sender starts again at this frame
+        self.log.info('session %s', payload)
+        self.peer = list(payload)
+        self.rcvbase = seq
+        self.received = {}
+        self.message = None
+        self.counters['sessions'] += 1
+      offset = (seq-self.rcvbase)%SEQ
+      if offset<self.window and seq not in self.received:
+        self.received[seq] = (kind, payload)
+      else:
+        #already delivered or buffered, only the ack is sent again
+        self.counters['duplicates'] += 1
+      while self.rcvbase in self.received:
+        kind, payload = self.received.pop(self.rcvbase)
+        self.rcvbase = (self.rcvbase+1)%SEQ
+        if kind == SYN:
+          continue
+        message = self._assemble(kind, payload)
+        if message is not None:
+          messages.append(message)
+      self.cv.notifyAll()
+    #the ack goes out with the next frame
+    self._wake()
+    for message in messages:
+      self.log.info('message received %s', message)
+      if self.handler:
+        self.handler(message)
+
+  def _assemble(self, kind, payload):
+    if kind == START:
+      self.message = list(payload)
+    elif self.message is None:
+      self.log.warning('fragment without start dropped')
+      return
+    else:
+      self.message += payload
+    if len(self.message)>self.message[0]:
+      message = self.message[1:1+self.message[0]]
+      self.message = None
+      self.counters['messagesReceived'] += 1
+      self.counters['bytesReceived'] += len(message)
+      return message
+
+  #------- transmit --------
+
+  def _next(self):
+    #the frame to transmit now or the time to wait for one
+    if self.acks:
+      seq = self.acks.popleft()
+      self.counters['acksSent'] += 1
+      return [ACK<<6|seq, 0, 0, 0], None
+    now = self.manager.clock.time()
+    due = None
+    for seq in sorted(self.inflight, key=lambda s: (s-self.base)%SEQ):
+      mid, kind, payload, sent, tries = self.inflight[seq]
+      deadline = sent+self.timeout*min(tries, 4)
+      if deadline<=now:
+        self.inflight[seq] = (mid, kind, payload, now, tries+1)
+        self.counters['framesSent'] += 1
+        self.counters['framesRetransmitted'] += 1
+        return [kind<<6|seq]+payload, None
+      due = deadline if due is None else min(due, deadline)
+    if self.queue and (self.nextseq-self.base)%SEQ<self.window and (self.synced or not self.inflight):
+      mid, kind, payload = self.queue.popleft()
+      seq = self.nextseq
+      self.nextseq = (self.nextseq+1)%SEQ
+      self.inflight[seq] = (mid, kind, payload, now, 1)
+      self.counters['framesSent'] += 1
+      return [kind<<6|seq]+payload, None
+    return None, (due-now if due is not None else None)
+
+  def _wake(self):
+    worker = self.worker
+    if worker:
+      worker.wake()
+
+  def _step(self):
+    #one frame every interval, return: seconds until the next step or None when idle
+    clock = self.manager.clock
+    with self.cv:
+      if not self.running:
+        return
+      now = clock.time()
+      if self.nextframe is not None and now<self.nextframe:
+        return self.nextframe-now
+      frame, wait = self._next()
+      if frame is None:
+        #idle until a message is queued or a frame received
+        return wait
+      self.nextframe = now+self.interval
+    try:
+      self.manager.sendIrCode(frame, self.power)
+    except Exception as err:
+      #the frame counts as lost, an unacknowledged one is sent again
+      self.log.error('sendIrCode %s failed: %s', frame, err)
+    return self.interval
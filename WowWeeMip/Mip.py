@@ -17,6 +17,12 @@ Read functions:
 
 getValue(a)       # Get Mip.attribute
 getUserValue(a)   # Get user value at address a 0-15
+readUserMemory()  # Get all 16 user bytes
+
+Write functions:
+
+writeUserMemory( offset, [b1,b2,...] )
+UserMemory( fields=[('id','B'),('trim','h')] )
 
 Action functions:
 
@@ -25,22 +31,41 @@ setMipPosition( Mip.position.onBack )
 distanceDrive( distance=20, angle=0 )
 driveWithTime( speed=70, t=1000 )
 turnByAngle( angle=180, speed=100 )
-stop()
+stop( reliable=False )
 continuousDrive( speed=20, spin=1, crazy=False )
-setGameMode( mode=Mip.gamemode.app )
-mipGetUp( mode=Mip.getupmode.fromAny)
+setGameMode( mode=Mip.gamemode.app, reliable=False )
+mipGetUp( mode=Mip.getupmode.fromAny, reliable=False )
 setChestLed( '#ff0000' )
 flashChestLed( r, g, b, time_on, time_off )
 setHeadLed( l1=Mip.headled.on, l2=Mip.headled.on, l3=Mip.headled.on, l4=Mip.headled.on )
 setMipVolume( volume=7 )
 setRadarMode( mode=Mip.radarmode.disabled )
+sendIrCode( [b1,b2,b3,b4], power=120 )
+setIrReceive( on=True )
+setEventFilter( on=True, debounce=0.3, window=5.0 )
+eventRates()
+apply( {'chestLed':'#ff0000', 'volume':3} )
+getState()
+syncState()
+setClock( Mip.VirtualClock() )
+sendReliable( [0x77], callback=None )
+writeStats()
+addRule( 'radar', {'value':'10cm'}, 'turnByAngle', 180, 100, cooldown=0.5 )
+removeRule( rule )
+ruleStats()
+startLinkMonitor( interval=2.0, maxRate=50, minRate=5 )
+stopLinkMonitor()
+linkQuality()
 connected()
 """
 
 import cb
 import time
+import heapq
+import struct
 import threading
 import logging
+from collections import deque
 
 
 class _Manager (object):
@@ -69,15 +94,31 @@ class _Manager (object):
     logging.basicConfig()
     #level = logging.getLevelName('DEBUG')
     level = logging.getLevelName('ERROR')
-    self.log.setLevel(level)
+    #default level once, the fleet robots and the encoders keep setManagerLogLevel()
+    if self.log.level == logging.NOTSET:
+      self.log.setLevel(level)
     self.log.info('__init__ %s',self)
     self.peripheral = None
     self.read_c = None
     self.write_c = None
     self.readvalue = None
+    self.usermemory = None
     self.ready = False
     self.cv = threading.Condition()
     self.handler = h
+    self.listeners = []
+    self.taps = []
+    self.filter = None
+    self.exclusive = True
+    self.state = State()
+    self.clock = Clock()
+    self.outstanding = deque()
+    self.window = 4
+    self.retries = 3
+    self.writeTimeout = 1.0
+    self.writeStats = dict.fromkeys(['delivered', 'failed', 'retransmitted'], 0)
+    self.rules = {}
+    self.monitor = None
 
   def __del__(self):
     self.log.info('__del__ %s',self)
@@ -107,7 +148,10 @@ class _Manager (object):
     self.read_c = None
     self.write_c = None
     self.readvalue = None
-    cb.reset()
+    if self.filter:
+      self.filter.reset()
+    self._failOutstanding('disconnected')
+    self._release(p)
     value_list = [0xffff]
     self._on_receive(value_list)
 
@@ -140,8 +184,21 @@ class _Manager (object):
         self.ready = True
         self.cv.notifyAll()
 
-  def did_writes_value(self, c, error):
-    self.log.info( 'did_write_value: %s %s', c.uuid,c.value)
+  def did_read_rssi(self, p, rssi, error):
+    self.log.info( 'did_read_rssi: %s %s', rssi, error)
+    if self.monitor and error is None:
+      self.monitor.rssi(rssi)
+
+  def did_write_value(self, c, error):
+    #writes with response complete in the order they were written
+    self.log.info( 'did_write_value: %s %s %s', c.uuid,c.value,error)
+    with self.cv:
+      w = self.outstanding.popleft() if self.outstanding else None
+      self.cv.notifyAll()
+    if w is not None:
+      self._complete(w, error)
+
+  did_writes_value = did_write_value
 
   def did_update_value(self, c, error):
     self.log.info('did_update_value')
@@ -150,6 +207,7 @@ class _Manager (object):
 
   def _on_receive(self,value_list):
     self.log.info('_on_receive')
+    received = self.clock.time()
     data={}
     #------ Notification events ------
     if value_list[0] == 0xffff: # disconnect
@@ -172,7 +230,7 @@ class _Manager (object):
     elif value_list[0] == 0xFA: # sleep 0b
       self.log.warning( 'sleep %s', map(hex,value_list))
       self.ready = False
-      cb.reset()
+      self._release(self.peripheral)
     elif value_list[0] == 0x1D: # clap times 1b
       self.log.info( 'clap times %s', map(hex,value_list))
       data={'clap':value_list[1]}
@@ -238,15 +296,29 @@ class _Manager (object):
       self.log.warning( 'unhandled event received %s', map(hex,value_list))
       data={'data':value_list}
       value_list[0] = 0x00
+    if value_list[0] in self.rules:
+      self._run_rules(value_list[0],data,received)
+    if self.taps:
+      self._notify_taps(_Manager.events[value_list[0]],data)
     self.on_event(_Manager.events[value_list[0]],data)
 
   def on_event(self, event, data={}):
     self.log.info( 'on_event %s %s',event,data)
-    if (type(self.readvalue)is not dict) and (self.readvalue in _Manager.events) and (event == _Manager.events[self.readvalue]):
+    self._track(event,data)
+    if event == 'userData' and self.usermemory is not None:
+      self.log.info( 'user memory %s', data)
+      with self.cv:
+        self.usermemory[int(data['address'],16)] = data['data']
+        self.cv.notifyAll()
+    elif (type(self.readvalue)is not dict) and (self.readvalue in _Manager.events) and (event == _Manager.events[self.readvalue]):
       self.log.info( 'The value is: %s', data)
       self.readvalue = data
       with self.cv:
         self.cv.notifyAll()
+    elif self.filter and not self.filter.accept(event,data):
+      self.log.info( 'event %s %s filtered', event, data)
+    elif self._notify_listeners(event,data):
+      self.log.info( 'event %s consumed by a listener', event)
     else:
       self.log.info('call Mip on-event, handler: %s',self.handler)
       self.handler(event,data)
@@ -254,34 +326,231 @@ class _Manager (object):
       #thread.daemon = True            # Daemonize thread
       #thread.start()                  # Start the execution
 
+  def addRule(self, rule):
+    #rules are indexed by opcode and run before the event is dispatched
+    self.log.info( 'addRule %s', rule)
+    rules = dict(self.rules)
+    rules[rule.opcode] = rules.get(rule.opcode, [])+[rule]
+    self.rules = rules
+
+  def removeRule(self, rule):
+    self.log.info( 'removeRule %s', rule)
+    rules = dict(self.rules)
+    rules[rule.opcode] = [r for r in rules.get(rule.opcode, []) if r is not rule]
+    if not rules[rule.opcode]:
+      del rules[rule.opcode]
+    self.rules = rules
+
+  def _run_rules(self, opcode, data, received):
+    for rule in self.rules.get(opcode, []):
+      try:
+        self._run_rule(rule, data, received)
+      except Exception as err:
+        self.log.error( 'rule %s failed: %s', rule, err)
+
+  def _run_rule(self, rule, data, received):
+    if not rule.match(data):
+      return
+    now = self.clock.time()
+    if now-rule.fired<rule.cooldown:
+      rule.stats['suppressed'] += 1
+      return
+    if not self.ready:
+      return
+    rule.fired = now
+    for message in rule.messages:
+      self.peripheral.write_characteristic_value(self.write_c, message, False)
+    self._remember(**rule.state)
+    rule._measure(self.clock.time()-received)
+    self.log.info( 'rule %s fired', rule)
+
+  def addListener(self, f):
+    #f(event,data) is called before the handler, returning True consumes the event
+    self.log.info( 'addListener %s', f)
+    if f not in self.listeners:
+      self.listeners = self.listeners+[f]
+
+  def removeListener(self, f):
+    self.log.info( 'removeListener %s', f)
+    self.listeners = [l for l in self.listeners if l != f]
+
+  def _notify_listeners(self, event, data):
+    consumed = False
+    for f in self.listeners:
+      try:
+        if f(event,data):
+          consumed = True
+      except Exception as err:
+        self.log.error( 'listener %s failed: %s', f, err)
+    return consumed
+
+  def addTap(self, f):
+    #f(event,data) sees every notification before the event filter and the listeners
+    self.log.info( 'addTap %s', f)
+    if f not in self.taps:
+      self.taps = self.taps+[f]
+
+  def removeTap(self, f):
+    self.log.info( 'removeTap %s', f)
+    self.taps = [t for t in self.taps if t != f]
+
+  def _notify_taps(self, event, data):
+    for f in self.taps:
+      try:
+        f(event,dict(data))
+      except Exception as err:
+        self.log.error( 'tap %s failed: %s', f, err)
+
   def send(self,message):
     self.log.info( 'send %s',message)
     if not self.ready:
       self.log.warning( 'MiP is not connected')
       return
+    if self.monitor and message[0] != 0x77:
+      self.monitor.throttle()
     self.peripheral.write_characteristic_value(self.write_c, bytes(bytearray(message)), False)
 
+  def _write_with_response(self, message, w=None):
+    #reads are queued as None so the completions stay in order
+    with self.cv:
+      self.outstanding.append(w)
+    self.peripheral.write_characteristic_value(self.write_c, bytes(bytearray(message)), True)
+
+  def sendReliable(self, message, callback=None):
+    #write with response, up to window writes are outstanding
+    self.log.info( 'sendReliable %s',message)
+    w = Write(message, callback)
+    with self.cv:
+      while self.ready and self._inflight()>=self.window:
+        self.clock.wait(self.cv, self.writeTimeout)
+    if not self.ready:
+      self.log.warning( 'MiP is not connected')
+      self.writeStats['failed'] += 1
+      w._finish(False, 'not connected')
+      return w
+    self._transmit(w)
+    return w
+
+  def _inflight(self):
+    return len([w for w in self.outstanding if w is not None])
+
+  def _transmit(self, w):
+    w.tries += 1
+    if w.tries>1:
+      self.log.warning( 'retransmit %s, try %d', w.message, w.tries)
+      self.writeStats['retransmitted'] += 1
+    w.timer = self.clock.timer(self.writeTimeout, self._expire, w)
+    self._write_with_response(w.message, w)
+
+  def _expire(self, w):
+    #completions come in order, so nothing older than w can still complete:
+    #the placeholders ahead of it are dropped, and so is w when it is sent
+    #again, a late completion then counts for the copy. A None is left only
+    #for a write that failed for good, to absorb its late completion.
+    with self.cv:
+      if w not in self.outstanding:
+        return
+      retry = w.tries<=self.retries and self.ready
+      outstanding = deque()
+      older = True
+      for o in self.outstanding:
+        if o is w:
+          older = False
+          if not retry:
+            outstanding.append(None)
+        elif o is not None or not older:
+          outstanding.append(o)
+      self.outstanding = outstanding
+      self.cv.notifyAll()
+    self._complete(w, 'timeout')
+
+  def _complete(self, w, error):
+    if w.done():
+      return
+    w.timer.cancel()
+    if error is None:
+      self.writeStats['delivered'] += 1
+      w._finish(True)
+    elif w.tries<=self.retries and self.ready:
+      self._transmit(w)
+    else:
+      self.log.error( 'write %s failed: %s', w.message, error)
+      self.writeStats['failed'] += 1
+      w._finish(False, error)
+
+  def _failOutstanding(self, error):
+    with self.cv:
+      writes = [w for w in self.outstanding if w is not None]
+      self.outstanding.clear()
+      self.cv.notifyAll()
+    for w in writes:
+      w.timer.cancel()
+      if not w.done():
+        self.writeStats['failed'] += 1
+        w._finish(False, error)
+
   def read(self,message):
     self.log.info('read %s',message)
     if not self.ready:
       self.log.warning( 'MiP is not connected')
       return
     self.readvalue = message[0]
-    self.peripheral.write_characteristic_value(self.write_c, bytes(bytearray(message)), True)
+    sent = self.clock.time()
+    self._write_with_response(message)
+    end = sent+1
     with self.cv:
-      self.log.info( 'waiting...')
-      self.cv.wait(1)
+      while type(self.readvalue) is not dict and self.clock.time()<end:
+        self.log.info( 'waiting...')
+        self.clock.wait(self.cv,end-self.clock.time())
+    if self.monitor:
+      self.monitor.read(self.clock.time()-sent if type(self.readvalue) is dict else None)
     return self.readvalue
 
+  def readUserMemory(self, timeout=1):
+    #all 16 requests are written before waiting for the responses
+    self.log.info('readUserMemory')
+    if not self.ready:
+      self.log.warning( 'MiP is not connected')
+      return
+    with self.cv:
+      self.usermemory = {}
+    for address in range(0x20,0x30):
+      self._write_with_response([0x13,address])
+    sent = self.clock.time()
+    end = sent+timeout
+    with self.cv:
+      while len(self.usermemory)<16 and self.clock.time()<end:
+        self.log.info( 'waiting...')
+        self.clock.wait(self.cv,end-self.clock.time())
+      memory = self.usermemory
+      self.usermemory = None
+    if self.monitor:
+      self.monitor.read(self.clock.time()-sent if len(memory) == 16 else None)
+    if len(memory)<16:
+      self.log.warning( 'user memory read timed out, %d of 16 bytes', len(memory))
+      return
+    return [memory[address] for address in range(0x20,0x30)]
+
+  def writeUserMemory(self, offset, data):
+    #offset:(0-15) 1 byte per address
+    self.log.info('writeUserMemory')
+    if not self.ready:
+      self.log.warning( 'MiP is not connected')
+      return False
+    for i,b in enumerate(data):
+      self.send([0x12,0x20+offset+i,b%256])
+    return True
+
   def disconnect(self):
     if self.ready:
       #self.ready = False
       self.log.info( 'Disconnecting...')
-      time.sleep(.5)
+      self.clock.sleep(.5)
       self.send([0xFC])
-    time.sleep(.5)
-    cb.reset()
+    self.clock.sleep(.5)
+    self._release(self.peripheral)
     self.ready = False
+    self._failOutstanding('disconnected')
     self.peripheral = None
     self.write_c = None
     self.read_c = None
@@ -289,18 +558,99 @@ class _Manager (object):
     #time.sleep(.5)
     self.log.info( 'Disconnected')
 
+  def _remember(self, **fields):
+    if self.ready:
+      for k, v in fields.items():
+        setattr(self.state, k, v)
+
+  def _track(self, event, data):
+    #known state from the requested values
+    modes = dict((v,k) for k,v in _Manager.mode.items())
+    radar = dict((v,k) for k,v in _Manager.status.items())
+    if event == 'chestLed' and len(data['ledRGB'])>=3:
+      self.state.chestLed = tuple(data['ledRGB'][:3])
+    elif event == 'headLed' and len(data['led1234'])>=4:
+      self.state.headLed = tuple(reversed(data['led1234'][:4]))  #l4 first, as written
+    elif event == 'volume':
+      self.state.volume = data['value']
+    elif event == 'radarStatus':
+      self.state.radarMode = radar.get(data['status'])
+    elif event == 'gameMode':
+      self.state.gameMode = modes.get(data['mode'])
+    elif event == 'disconnected':
+      self.state = State()
+
+  def syncState(self):
+    #seed the known state, the read responses are tracked by on_event
+    for a in (0x83, 0x8B, 0x16, 0x0D, 0x82):
+      self.read([a])
+    return self.state.copy()
+
+  def apply(self, desired):
+    #send only the commands of the fields that differ from the known state
+    if not self.ready:
+      self.log.warning( 'MiP is not connected')
+      return []
+    if isinstance(desired, dict):
+      desired = State(**desired)
+    known = self.state
+    sent = []
+    chest = desired.chestLed if desired.chestLed is not None else known.chestLed
+    flash = desired.flash if desired.flash is not None else known.flash
+    if desired.flash == ():
+      flash = None
+    if chest is not None and (chest != known.chestLed or flash != known.flash):
+      if flash:
+        self.flashChestLed(chest[0], chest[1], chest[2], flash[0], flash[1])
+        sent.append('flashChestLed')
+      else:
+        self.setChestLed(*chest)
+        sent.append('setChestLed')
+    if desired.headLed is not None:
+      head = list(known.headLed or (None,)*4)
+      for i, l in enumerate(desired.headLed):
+        if l is not None:
+          head[i] = l%4
+      if tuple(head) != known.headLed:
+        if None in head:
+          self.log.warning( 'head leds are unknown, sync or set all of them')
+        else:
+          self.setHeadLed(*head)
+          sent.append('setHeadLed')
+    if desired.volume is not None and desired.volume%8 != known.volume:
+      self.setMipVolume(desired.volume)
+      sent.append('setMipVolume')
+    if desired.radarMode is not None and desired.radarMode != known.radarMode:
+      self.setRadarMode(desired.radarMode)
+      sent.append('setRadarMode')
+    if desired.gameMode is not None and desired.gameMode%9 != known.gameMode:
+      self.setGameMode(desired.gameMode)
+      sent.append('setGameMode')
+    self.log.info( 'apply sent %s', sent)
+    return sent
+
+  def _release(self, p):
+    #a manager sharing the central with other robots drops only its own link
+    if self.exclusive:
+      cb.reset()
+    elif p:
+      cb.cancel_peripheral_connection(p)
+
+  def _sleep(self, t):
+    self.clock.sleep(t)
+
   def connect(self):
     self.log.info('Connecting...')
     self.peripheral = None
     if cb.get_state() <> 5:
       self.log.warning('Bluetooth not enabled...')
       while cb.get_state() <> 5:
-        time.sleep(1)
+        self.clock.sleep(1)
     cb.set_central_delegate(self)
     self.log.info( '## Scanning for peripherals... ##')
     with self.cv:
       cb.scan_for_peripherals()
-      self.cv.wait(15)
+      self.clock.wait(self.cv,15)
     if not self.ready:
       self.disconnect()
       result = False
@@ -351,7 +701,7 @@ class _Manager (object):
     args.append(angle/256)
     args.append(angle%256)
     self.send(args)
-    time.sleep(distance*6/100+angle/45)
+    self._sleep(distance*6/100+angle/45)
 
   def driveWithTime(self, speed=100, t=1000):
     #speed:(-100 - +100) t:(0-1785ms)
@@ -363,7 +713,7 @@ class _Manager (object):
     args.append(speed)
     args.append(int((t%1786)/7))
     self.send(args)
-    time.sleep(t/1000.0)
+    self._sleep(t/1000.0)
 
   def turnByAngle(self, angle=180, speed=100):
     #angle:(-1275deg - +1275deg) speed:(0-100)
@@ -376,10 +726,12 @@ class _Manager (object):
     args.append(angle)
     args.append(speed)
     self.send(args)
-    time.sleep(angle*(64/36)/(speed+1))
+    self._sleep(angle*(64/36)/(speed+1))
 
-  def stop(self):
+  def stop(self, reliable=False):
     self.log.info( 'stop')
+    if reliable:
+      return self.sendReliable([0x77])
     self.send([0x77])
 
   def continuousDrive(self, speed=20, spin=1, crazy=False):
@@ -397,40 +749,576 @@ class _Manager (object):
     args.append(speed)
     args.append(spin)
     self.send(args)
-    time.sleep(0.05)
+    self._sleep(0.05)
 
-  def setGameMode(self, mode=1):
+  def setGameMode(self, mode=1, reliable=False):
     self.log.info( 'setGameMode')
+    self._remember(gameMode=mode%9)
+    if reliable:
+      return self.sendReliable([0x76,mode%9])
     self.send([0x76,mode%9])
 
-  def mipGetUp(self, mode=2):
+  def mipGetUp(self, mode=2, reliable=False):
     self.log.info( 'mipGetUp')
+    if reliable:
+      return self.sendReliable([0x23,mode%3])
     self.send([0x23,mode%3])
 
   def setChestLed(self, r, g, b):
     self.log.info( 'setChestLed')
     self.send([0x84,r%256,g%256,b%256])
+    self._remember(chestLed=(r%256,g%256,b%256), flash=None)
 
   def flashChestLed(self, r, g, b, time_on = 500, time_off = 500):
     self.log.info( 'flashChestLed')
     time_on = int(abs(time_on/20))%256
     time_off = int(abs(time_off/20))%256
     self.send([0x89,r%256,g%256,b%256,time_on,time_off])
+    self._remember(chestLed=(r%256,g%256,b%256), flash=(time_on*20,time_off*20))
 
   def setHeadLed(self, l1=1, l2=1, l3=1, l4=1):
     #0-3,0-3,0-3,0-3
     self.log.info( 'setHeadLed')
     self.send([0x8A,l4%4,l3%4,l2%4,l1%4])
+    self._remember(headLed=(l1%4,l2%4,l3%4,l4%4))
 
   def setMipVolume(self, volume=7):
     #0-7
     self.log.info( 'setMipVolume')
     self.send([0x15,volume%8])
+    self._remember(volume=volume%8)
 
   def setRadarMode(self, mode=0):
     #0,2,4
     self.log.info( 'setRadarMode')
     self.send([0x0C, mode])
+    self._remember(radarMode=mode)
+
+  def sendIrCode(self, code, power=120):
+    #code: 4 bytes, power:(1-120)
+    self.log.info( 'sendIrCode')
+    args=[0x8C]
+    for b in (list(code)+[0,0,0,0])[:4]:
+      args.append(b%256)
+    args.append(0x20)
+    args.append(min(max(int(power),1),0x78))
+    self.send(args)
+
+  def setIrReceive(self, on=True):
+    self.log.info( 'setIrReceive')
+    self.send([0x10, 1 if on else 0])
+
+
+class State(object):
+  '''
+  State(chestLed=None, flash=None, headLed=None, volume=None, radarMode=None, gameMode=None)
+  Robot state, None is unknown or unchanged
+  chestLed: (r, g, b) or '#rrggbb'
+  flash: (time_on, time_off) in ms, () for a steady chest led
+  headLed: (l1, l2, l3, l4), single leds can be None
+  '''
+
+  fields = ('chestLed', 'flash', 'headLed', 'volume', 'radarMode', 'gameMode')
+
+  def __init__(self, chestLed=None, flash=None, headLed=None, volume=None, radarMode=None, gameMode=None):
+    if isinstance(chestLed, basestring):
+      chestLed = (int(chestLed[1:3],16), int(chestLed[3:5],16), int(chestLed[5:7],16))
+    if flash:
+      flash = (int(abs(flash[0]/20))%256*20, int(abs(flash[1]/20))%256*20)
+    self.chestLed = tuple(chestLed) if chestLed is not None else None
+    self.flash = tuple(flash) if flash is not None else None
+    self.headLed = tuple(headLed) if headLed is not None else None
+    self.volume = volume
+    self.radarMode = radarMode
+    self.gameMode = gameMode
+
+  def copy(self):
+    return State(**self.as_dict())
+
+  def as_dict(self):
+    return dict((k, getattr(self, k)) for k in State.fields)
+
+  def __repr__(self):
+    return 'State(%s)' % ', '.join('%s=%r' % (k, getattr(self, k)) for k in State.fields)
+
+
+class Clock(object):
+  '''
+  Clock used by the manager to sleep, wait for responses, run timers and
+  timestamp events
+  '''
+
+  def time(self):
+    return time.time()
+
+  def sleep(self, t):
+    time.sleep(t)
+
+  def wait(self, cv, timeout):
+    #cv is held by the caller
+    cv.wait(timeout)
+
+  def timer(self, t, f, *args):
+    #f(*args) in t seconds, the returned timer has cancel()
+    timer = threading.Timer(t, f, args)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+  def worker(self, step):
+    #step() returns the seconds until it runs again, or None to wait for wake()
+    return _Worker(step)
+
+
+class _Worker(object):
+  #runs step() in its own thread
+
+  def __init__(self, step):
+    self.step = step
+    self.cv = threading.Condition()
+    self.woken = False
+    self.stopped = False
+    self.thread = threading.Thread(target=self._run, args=())
+    self.thread.daemon = True
+    self.thread.start()
+
+  def wake(self):
+    with self.cv:
+      self.woken = True
+      self.cv.notifyAll()
+
+  def stop(self):
+    with self.cv:
+      self.stopped = True
+      self.cv.notifyAll()
+    if threading.current_thread() is not self.thread:
+      self.thread.join()
+
+  def _run(self):
+    while True:
+      with self.cv:
+        if self.stopped:
+          return
+        self.woken = False
+      delay = self.step()
+      with self.cv:
+        if not self.woken and not self.stopped:
+          self.cv.wait(1 if delay is None else delay)
+
+
+class _VirtualWorker(object):
+  #runs step() from the timers of a VirtualClock, in the thread moving the time
+
+  def __init__(self, clock, step):
+    self.clock = clock
+    self.step = step
+    self.lock = threading.Lock()
+    self.timer = None
+    self.due = None
+    self.stopped = False
+    self.wake()
+
+  def wake(self):
+    self._schedule(0)
+
+  def stop(self):
+    with self.lock:
+      self.stopped = True
+      if self.timer:
+        self.timer.cancel()
+
+  def _schedule(self, delay):
+    with self.lock:
+      due = self.clock.time()+delay
+      if self.stopped or self.timer and self.due<=due:
+        return
+      if self.timer:
+        self.timer.cancel()
+      self.due = due
+      self.timer = self.clock.timer(delay, self._run)
+
+  def _run(self):
+    with self.lock:
+      self.timer = None
+    delay = self.step()
+    if delay is not None:
+      self._schedule(delay)
+
+
+class _VirtualTimer(object):
+
+  def __init__(self, due, f, args):
+    self.due = due
+    self.function = f
+    self.args = args
+    self.cancelled = False
+
+  def cancel(self):
+    self.cancelled = True
+
+
+class VirtualClock(Clock):
+  '''
+  VirtualClock(start=0.0)
+  Clock that jumps ahead instead of sleeping. The time moves only when a
+  thread sleeps, waits or calls advance(), and the timers and workers
+  (link monitor, reliable write timeouts, IrLink, Animation.Player) run
+  in that thread in time order, so a script replays the same way every
+  time. A wait returns after the first timer due before its timeout, or
+  at the timeout. The responses must arrive while the request is
+  written, as with Simulator.VirtualMip.
+  Limits: the workers only run while the script sleeps or waits on the
+  clock, a loop around time.sleep() stalls them. Fleet.broadcast and
+  the Gateway threads move the clock from their own threads, their
+  timing depends on the thread scheduling.
+  '''
+
+  def __init__(self, start=0.0):
+    self.now = float(start)
+    self.lock = threading.Lock()
+    self.timers = []
+    self.count = 0
+
+  def time(self):
+    return self.now
+
+  def sleep(self, t):
+    self.advance(t)
+
+  def wait(self, cv, timeout):
+    #a timer stands for the notify that ends a real wait
+    self._advance(timeout, True)
+
+  def timer(self, t, f, *args):
+    with self.lock:
+      timer = _VirtualTimer(self.now+max(t, 0), f, args)
+      self.count += 1
+      heapq.heappush(self.timers, (timer.due, self.count, timer))
+    return timer
+
+  def worker(self, step):
+    return _VirtualWorker(self, step)
+
+  def advance(self, t):
+    self._advance(t, False)
+
+  def _advance(self, t, first):
+    with self.lock:
+      end = self.now+max(t, 0)
+    while True:
+      with self.lock:
+        if not self.timers or self.timers[0][0]>end:
+          self.now = max(self.now, end)
+          return
+        due, n, timer = heapq.heappop(self.timers)
+        self.now = max(self.now, due)
+      if not timer.cancelled:
+        timer.function(*timer.args)
+        if first:
+          return
+
+
+class LinkMonitor(object):
+  '''
+  LinkMonitor(manager, interval=2.0, maxRate=50, minRate=5)
+  Link quality from the peripheral RSSI, the read timeout rate and the
+  read round trip time. The quality (0-1) sets the limit of commands per
+  second written by send(), stop is never delayed, and a 'link_quality'
+  event is sent when the quality level changes.
+  '''
+
+  levels = ((0.7, 'good'), (0.4, 'fair'), (0.0, 'poor'))
+
+  def __init__(self, manager, interval=2.0, maxRate=50, minRate=5):
+    self.manager = manager
+    self.interval = interval
+    self.maxRate = float(maxRate)
+    self.minRate = float(minRate)
+    self.lock = threading.Lock()
+    self.lastRssi = None
+    self.timeouts = 0.0
+    self.rtt = None
+    self.baseRtt = None
+    self.quality = 1.0
+    self.level = 'good'
+    self.rate = self.maxRate
+    self.next = 0.0
+    self.counters = dict.fromkeys(['samples', 'reads', 'timeouts', 'throttled'], 0)
+    self.stopped = False
+    self.timer = None
+    self._schedule()
+
+  def stop(self):
+    with self.lock:
+      self.stopped = True
+      if self.timer:
+        self.timer.cancel()
+
+  def reschedule(self):
+    #after the manager clock is replaced
+    with self.lock:
+      if self.timer:
+        self.timer.cancel()
+    self._schedule()
+
+  def _schedule(self):
+    #sampled from a timer of the manager clock, so a VirtualClock drives it too
+    with self.lock:
+      if not self.stopped:
+        self.timer = self.manager.clock.timer(self.interval, self._sample)
+
+  def _sample(self):
+    p = self.manager.peripheral
+    if self.manager.ready and p is not None:
+      if hasattr(p, 'read_rssi'):
+        p.read_rssi()
+      elif getattr(p, 'rssi', None) is not None:
+        self.rssi(p.rssi)
+    self._schedule()
+
+  def rssi(self, value):
+    with self.lock:
+      self.counters['samples'] += 1
+      self.lastRssi = value
+    self._update()
+
+  def read(self, rtt):
+    #rtt is None for a read that timed out
+    with self.lock:
+      self.counters['reads'] += 1
+      self.timeouts = 0.8*self.timeouts+(0.2 if rtt is None else 0.0)
+      if rtt is None:
+        self.counters['timeouts'] += 1
+      else:
+        self.rtt = rtt if self.rtt is None else 0.8*self.rtt+0.2*rtt
+        self.baseRtt = rtt if self.baseRtt is None else min(self.baseRtt, rtt)
+    self._update()
+
+  def _update(self):
+    with self.lock:
+      q = [1.0-min(self.timeouts*2, 1.0)]
+      if self.lastRssi is not None:
+        #-90dBm unusable, -55dBm and above full rate
+        q.append(min(max((self.lastRssi+90)/35.0, 0.0), 1.0))
+      if self.rtt and self.baseRtt:
+        q.append(min(max(2.0-self.rtt/(2*self.baseRtt), 0.0), 1.0))
+      self.quality = min(q)
+      self.rate = self.minRate+(self.maxRate-self.minRate)*self.quality
+      level = [name for limit, name in LinkMonitor.levels if self.quality>=limit][0]
+      changed = level != self.level
+      self.level = level
+      data = self._status()
+    if changed:
+      self.manager.on_event('link_quality', data)
+
+  def _status(self):
+    return {'quality':round(self.quality, 2), 'level':self.level, 'rate':round(self.rate, 1),
+      'rssi':self.lastRssi, 'rtt':self.rtt, 'timeoutRate':round(self.timeouts, 2)}
+
+  def status(self):
+    with self.lock:
+      s = self._status()
+      s.update(self.counters)
+    return s
+
+  def throttle(self):
+    #wait for the next write slot of the adaptive rate
+    clock = self.manager.clock
+    with self.lock:
+      now = clock.time()
+      wait = self.next-now
+      self.next = max(self.next, now)+1.0/self.rate
+      if wait>0:
+        self.counters['throttled'] += 1
+    if wait>0:
+      clock.sleep(wait)
+
+
+class Write(object):
+  '''
+  Write(message, callback=None)
+  Completion of a reliable write, callback(write) is called once it is
+  delivered or failed
+  '''
+
+  def __init__(self, message, callback=None):
+    self.message = message
+    self.callback = callback
+    self.tries = 0
+    self.ok = None
+    self.error = None
+    self.timer = None
+    self.event = threading.Event()
+
+  def done(self):
+    return self.event.is_set()
+
+  def wait(self, timeout=None):
+    '''
+    wait(timeout=None)
+    Return: True delivered, False failed or None still pending
+    '''
+    self.event.wait(timeout)
+    return self.ok
+
+  def _finish(self, ok, error=None):
+    self.ok = ok
+    self.error = error
+    self.event.set()
+    if self.callback:
+      try:
+        self.callback(self)
+      except Exception as err:
+        log.error( 'write callback %s failed: %s', self.callback, err)
+
+
+class Rule(object):
+  '''
+  Rule(event, when, command, *args, cooldown=0.5)
+  Send a command when an event matches, without going through the
+  delegate function. The command is encoded once when the rule is made.
+  when: None, dictionary of data values or function f(data)
+  Mip.Rule('radar', {'value':'10cm'}, 'turnByAngle', 180, 100)
+  '''
+
+  def __init__(self, event, when, command, *args, **kwargs):
+    names = dict((v,k) for k,v in _Manager.events.items())
+    if event not in names:
+      raise ValueError('%s is not an event' % event)
+    self.event = event
+    self.opcode = names[event]
+    self.when = when
+    self.command = command
+    self.cooldown = kwargs.get('cooldown', 0.5)
+    r = _record(command, *args)
+    self.messages = r.messages
+    self.state = dict(r.remembered)
+    self.fired = float('-inf')
+    self.stats = {'fired':0, 'suppressed':0, 'latency':None, 'maxLatency':0.0}
+
+  def match(self, data):
+    if self.when is None:
+      return True
+    if callable(self.when):
+      return self.when(data)
+    for k, v in self.when.items():
+      if data.get(k) != v:
+        return False
+    return True
+
+  def _measure(self, latency):
+    #event received to command written
+    s = self.stats
+    s['fired'] += 1
+    s['latency'] = latency if s['latency'] is None else 0.9*s['latency']+0.1*latency
+    s['maxLatency'] = max(s['maxLatency'], latency)
+
+  def __repr__(self):
+    return 'Rule(%s, %r, %s)' % (self.event, self.when, self.command)
+
+
+class _Recorder(_Manager):
+  #runs a _Manager command without a link and keeps the encoded messages
+
+  def __init__(self):
+    _Manager.__init__(self, None)
+    self.ready = True
+    self.messages = []
+    self.remembered = {}
+
+  def send(self, message):
+    self.messages.append(bytes(bytearray(message)))
+
+  def _remember(self, **fields):
+    #the fields the command sets, None values included
+    _Manager._remember(self, **fields)
+    self.remembered.update(fields)
+
+  def _sleep(self, t):
+    pass
+
+
+def encode(command, *args):
+  '''
+  encode(command, *args)
+  Encode a _Manager command without sending it
+  Return: list of the messages the command writes
+  Mip.encode('setChestLed', 255, 0, 0)
+  '''
+  return _record(command, *args).messages
+
+def _record(command, *args):
+  #the recorder keeps the state the command sets next to the messages
+  r = _Recorder()
+  getattr(r, command)(*args)
+  return r
+
+
+class EventFilter(object):
+  '''
+  Streaming stage for the radar and gesture bursts.
+  radar: only changes are dispatched, with the previous value added
+  gesture: a repeat of the same gesture within debounce seconds of the
+  last one sent is dropped
+  Every received value is counted in a sliding window of window seconds.
+  '''
+
+  fields={'radar':'value', 'gesture':'gesture'}
+
+  def __init__(self, debounce=0.3, window=5.0, clock=None):
+    self.clock = clock or Clock()
+    self.debounce = debounce
+    self.window = window
+    self.last = {}
+    self.history = {}
+    self.lock = threading.Lock()
+
+  def accept(self, event, data):
+    if event not in EventFilter.fields:
+      return True
+    value = data[EventFilter.fields[event]]
+    now = self.clock.time()
+    with self.lock:
+      h = self.history.setdefault(event, deque())
+      h.append((now,value))
+      self._expire(h, now)
+      previous, t = self.last.get(event, (None, 0))
+      if event == 'radar':
+        if value == previous:
+          return False
+        self.last[event] = (value, now)
+        data['previous'] = previous
+        return True
+      if value == previous and now-t<self.debounce:
+        return False
+      #the timer restarts only when a gesture is sent
+      self.last[event] = (value, now)
+      return True
+
+  def reset(self):
+    with self.lock:
+      self.last = {}
+      self.history = {}
+
+  def _expire(self, h, now):
+    while h and h[0][0]<now-self.window:
+      h.popleft()
+
+  def counts(self):
+    #{event: {value: count}} in the last window seconds
+    now = self.clock.time()
+    r = {}
+    with self.lock:
+      for event, h in self.history.items():
+        self._expire(h, now)
+        c = r.setdefault(event, {})
+        for t, value in h:
+          c[value] = c.get(value, 0)+1
+    return r
+
+  def rates(self):
+    #{event: {value: events per second}}
+    return dict((event, dict((v, n/float(self.window)) for v, n in c.items())) for event, c in self.counts().items())
 
 
 class attribute:
@@ -550,6 +1438,139 @@ def getUserValue( address):
   log.info('Value for address %s is %s', hex(address), r)
   return r
 
+def readUserMemory():
+  '''
+  readUserMemory()
+  Get the 16 user bytes stored in Mip memory, the requests are sent
+  together instead of one round trip per address
+  Return: list of 16 values or None in case of failure
+  '''
+  log.info('readUserMemory')
+  r = _manager.readUserMemory()
+  log.info('User memory is %s', r)
+  return r
+
+def writeUserMemory(offset, data):
+  '''
+  writeUserMemory(offset, data)
+  Store the bytes of data in Mip user memory starting at offset
+  offset: ( 0-15 ), offset+len(data) <= 16
+  Return: True or False
+  Mip.writeUserMemory(4, [0x12, 0x34])
+  '''
+  log.info('writeUserMemory, offset %d, %s', offset, data)
+  if offset<0 or offset+len(data)>16:
+    log.warning('Value out of range 0-15')
+    return False
+  return _manager.writeUserMemory(offset, data)
+
+class UserMemory(object):
+  '''
+  UserMemory(fields=None)
+  Write-back cache of the 16 user bytes with an optional typed layout.
+  The block is read once, set() and __setitem__ change the cache only and
+  flush() writes the bytes that differ from the robot copy.
+  fields: list of (name, struct format) packed little endian from address 0
+  mem = Mip.UserMemory([('id','B'), ('trim','h'), ('name','8s')])
+  mem.set('trim', -12)
+  mem.flush()
+  '''
+
+  def __init__(self, fields=None):
+    self.fields = {}
+    offset = 0
+    for name, fmt in fields or []:
+      size = struct.calcsize('<'+fmt)
+      self.fields[name] = (offset, '<'+fmt)
+      offset += size
+    if offset>16:
+      raise ValueError('fields need %d bytes, user memory has 16' % offset)
+    self.cache = None
+    self.stored = None
+
+  def load(self, force=False):
+    '''
+    load(force=False)
+    Read the block from Mip unless it is already cached
+    Return: True or False
+    '''
+    if self.cache is not None and not force:
+      return True
+    r = readUserMemory()
+    if r is None:
+      return False
+    self.cache = list(r)
+    self.stored = list(r)
+    return True
+
+  def _loaded(self):
+    if self.load():
+      return True
+    log.warning('user memory could not be read')
+    return False
+
+  def __getitem__(self, address):
+    if not self._loaded():
+      return None
+    return self.cache[address]
+
+  def __setitem__(self, address, value):
+    if self._loaded():
+      self.cache[address] = value%256
+
+  def get(self, name):
+    '''
+    get(name)
+    Return: the value of the field, None if the memory could not be read
+    '''
+    offset, fmt = self.fields[name]
+    if not self._loaded():
+      return None
+    raw = bytearray(self.cache[offset:offset+struct.calcsize(fmt)])
+    return struct.unpack(fmt, bytes(raw))[0]
+
+  def set(self, name, value):
+    '''
+    set(name, value)
+    Pack the value of the field in the cache, use flush() to write it
+    Return: True or False if the memory could not be read
+    '''
+    offset, fmt = self.fields[name]
+    if not self._loaded():
+      return False
+    for i,b in enumerate(bytearray(struct.pack(fmt, value))):
+      self.cache[offset+i] = b
+    return True
+
+  def dirty(self):
+    '''
+    dirty()
+    Return: list of the addresses changed since the last flush()
+    '''
+    if self.cache is None:
+      return []
+    return [i for i in range(16) if self.cache[i] != self.stored[i]]
+
+  def flush(self):
+    '''
+    flush()
+    Write the changed bytes, one write command per byte
+    Return: the number of bytes written
+    '''
+    changed = self.dirty()
+    i = 0
+    while i<len(changed):
+      j = i
+      while j+1<len(changed) and changed[j+1] == changed[j]+1:
+        j += 1
+      start = changed[i]
+      if not writeUserMemory(start, self.cache[start:changed[j]+1]):
+        return 0
+      i = j+1
+    for address in changed:
+      self.stored[address] = self.cache[address]
+    return len(changed)
+
 def delegate_function(o):
   '''
   delegate_function(function)
@@ -572,7 +1593,7 @@ def playSound( *argv):
     log.info('%s',i)
   wait = _manager.playSound(*argv)
   if _waitForSound:
-    time.sleep(wait)
+    _manager.clock.sleep(wait)
 
 def setMipPosition(p=0):
   '''
@@ -609,13 +1630,15 @@ def turnByAngle( angle=180, speed=100):
   log.info('turnByAngle, angle %ddeg, speed %d', angle, speed)
   _manager.turnByAngle(angle,speed)
 
-def stop():
+def stop(reliable=False):
   '''
-  stop()
+  stop(reliable=False)
   Stop any Mip movement
+  reliable: write with response and retransmit on failure
+  Return: Mip.Write when reliable, w.wait() is True once delivered
   '''
   log.info('stop')
-  _manager.stop()
+  return _manager.stop(reliable)
 
 def continuousDrive(speed=20, spin=1, crazy=False):
   '''
@@ -630,21 +1653,23 @@ def continuousDrive(speed=20, spin=1, crazy=False):
   log.info('continuousDrive, speed=%d, spin=%d', speed, spin)
   _manager.continuousDrive(speed,spin,crazy)
 
-def setGameMode( mode=1):
+def setGameMode( mode=1, reliable=False):
   '''
-  setGameMode(mode=Mip.gamemode.app)
+  setGameMode(mode=Mip.gamemode.app, reliable=False)
   Set game mode
+  Return: Mip.Write when reliable
   '''
   log.info('setGameMode, %d', mode)
-  _manager.setGameMode(mode)
+  return _manager.setGameMode(mode, reliable)
 
-def mipGetUp(mode=2):
+def mipGetUp(mode=2, reliable=False):
   '''
-  mipGetUp( mode=Mip.getupmode.fromAny )
+  mipGetUp( mode=Mip.getupmode.fromAny, reliable=False )
   Mip will attempt to get up from front, back or both if angle is correct
+  Return: Mip.Write when reliable
   '''
   log.info('mipGetUp, %d', mode)
-  _manager.mipGetUp(mode)
+  return _manager.mipGetUp(mode, reliable)
 
 def setChestLed(r ='#00ff00' , g = None, b = None):
   '''
@@ -695,6 +1720,169 @@ def setRadarMode(mode=0):
   log.info( 'setRadarMode, %d', mode)
   _manager.setRadarMode(mode)
 
+def setEventFilter(on=True, debounce=0.3, window=5.0):
+  '''
+  setEventFilter(on=True, debounce=0.3, window=5.0)
+  Filter the radar and gesture bursts before the delegate function,
+  radar events are sent only when the value changes, with data
+  {'value':'30cm', 'previous':'clear'}, and the same gesture is sent
+  once every debounce seconds
+  '''
+  log.info('setEventFilter, %s, debounce %s, window %s', on, debounce, window)
+  _manager.filter = EventFilter(debounce, window, _manager.clock) if on else None
+
+def eventRates():
+  '''
+  eventRates()
+  Radar and gesture values per second, counted before filtering
+  Return: dictionary {'radar':{'clear':2.4, '30cm':0.6}, 'gesture':{...}} or None
+  '''
+  if not _manager.filter:
+    log.warning('Use setEventFilter() to count the events')
+    return None
+  return _manager.filter.rates()
+
+def getState():
+  '''
+  getState()
+  Return: the last known Mip.State, from the commands sent and the values read
+  '''
+  return _manager.state.copy()
+
+def syncState():
+  '''
+  syncState()
+  Read chest led, head leds, volume, radar and game mode from Mip
+  Return: the known Mip.State
+  '''
+  log.info('syncState')
+  return _manager.syncState()
+
+def apply(desired):
+  '''
+  apply(desired)
+  Send only the commands needed to reach the desired Mip.State or dict,
+  fields that are None are left as they are
+  Return: list of the commands sent
+  Mip.apply({'chestLed':'#ff0000', 'volume':3})
+  Mip.apply(Mip.State(headLed=(Mip.headled.on, None, None, Mip.headled.blink)))
+  '''
+  log.info('apply, %s', desired)
+  return _manager.apply(desired)
+
+def sendReliable(message, callback=None):
+  '''
+  sendReliable(message, callback=None)
+  Write a raw command with response, up to 4 writes are outstanding,
+  failed writes are sent again 3 times
+  Return: Mip.Write, callback(write) is called when it completes
+  '''
+  log.info('sendReliable, %s', message)
+  return _manager.sendReliable(message, callback)
+
+def writeStats():
+  '''
+  writeStats()
+  Return: dictionary {'delivered', 'failed', 'retransmitted', 'outstanding'}
+  '''
+  s = dict(_manager.writeStats)
+  s['outstanding'] = _manager._inflight()
+  return s
+
+def addRule(event, when, command, *args, **kwargs):
+  '''
+  addRule(event, when, command, *args, cooldown=0.5)
+  Run command as soon as event is decoded and when matches its data,
+  the rule fires at most once every cooldown seconds
+  Return: the Mip.Rule, rule.stats has the event to command latency
+  Mip.addRule('radar', {'value':'10cm'}, 'turnByAngle', 180, 100)
+  Mip.addRule('status', {'position':'faceDown'}, 'mipGetUp', Mip.getupmode.fromAny)
+  Mip.addRule('shake', None, 'stop')
+  '''
+  rule = Rule(event, when, command, *args, **kwargs)
+  log.info('addRule, %s', rule)
+  _manager.addRule(rule)
+  return rule
+
+def removeRule(rule):
+  '''
+  removeRule(rule)
+  Remove a rule made by addRule()
+  '''
+  log.info('removeRule, %s', rule)
+  _manager.removeRule(rule)
+
+def ruleStats():
+  '''
+  ruleStats()
+  Return: list of (rule, {'fired', 'suppressed', 'latency', 'maxLatency'})
+  '''
+  return [(rule, dict(rule.stats)) for rules in _manager.rules.values() for rule in rules]
+
+def startLinkMonitor(interval=2.0, maxRate=50, minRate=5):
+  '''
+  startLinkMonitor(interval=2.0, maxRate=50, minRate=5)
+  Sample the RSSI every interval seconds, track read timeouts and round
+  trip time and limit the commands per second between minRate and
+  maxRate with the link quality. The delegate gets 'link_quality'
+  events {'quality', 'level', 'rate', 'rssi', 'rtt', 'timeoutRate'}
+  '''
+  log.info('startLinkMonitor, %s', interval)
+  stopLinkMonitor()
+  _manager.monitor = LinkMonitor(_manager, interval, maxRate, minRate)
+
+def stopLinkMonitor():
+  '''
+  stopLinkMonitor()
+  Stop the link monitor and the command rate limit
+  '''
+  if _manager.monitor:
+    _manager.monitor.stop()
+    _manager.monitor = None
+
+def linkQuality():
+  '''
+  linkQuality()
+  Return: dictionary with the link quality or None without a link monitor
+  '''
+  if not _manager.monitor:
+    return None
+  return _manager.monitor.status()
+
+def setClock(clock=None):
+  '''
+  setClock(clock=None)
+  Use clock for every sleep, wait, timer and timestamp, also those of
+  the link monitor, IrLink, Animation, Gateway and reliable writes.
+  Mip.VirtualClock() runs scripts faster than real time, None is the
+  real time clock. IrLink and Animation.Player run on the clock set
+  when they start
+  '''
+  log.info('setClock, %s', clock)
+  _manager.clock = clock or Clock()
+  if _manager.filter:
+    _manager.filter.clock = _manager.clock
+  if _manager.monitor:
+    _manager.monitor.reschedule()
+
+def sendIrCode(code, power=120):
+  '''
+  sendIrCode(code, power=120)
+  Transmit a 4 byte IR code, received by other MiPs as 'irCode' event
+  power: 1-120
+  Mip.sendIrCode([0x01, 0x02, 0x03, 0x04])
+  '''
+  log.info('sendIrCode, %s, power %d', code, power)
+  _manager.sendIrCode(code, power)
+
+def setIrReceive(on=True):
+  '''
+  setIrReceive(on=True)
+  Enable or disable the 'irCode' events
+  '''
+  log.info('setIrReceive, %s', on)
+  _manager.setIrReceive(on)
+
 _func = None
 _waitForSound = False
 log = logging.getLogger('Mip')
@@ -0,0 +1,192 @@
+# coding: utf-8
+"""
+WowWeeMip stand-in MiP peripheral for running scripts without a robot
+_________________________________________
+use:
+from WowWeeMip import Mip, Simulator
+
+sim = Simulator.start()          # virtual clock, no real sleeps
+Mip.distanceDrive(100, 90)
+Mip.playSound([Mip.sound.beep, 500])
+print Mip.getValue(Mip.attribute.odometer), sim.clock.time()
+sim.notify([0x0C, 2])            # radar 30cm event
+Simulator.stop(sim)
+
+_________________________________________
+VirtualMip keeps the state set by the commands, answers the reads while
+the request is written and records every command with the time of the
+manager clock. Writes with response are confirmed at once, or fail
+with probability writeErrors, writes without response are lost with
+the same probability. With ackErrors a write with response is executed
+but its confirmation is lost. Two simulated robots can be linked so that the
+IR codes sent by one are received by the other.
+"""
+
+import binascii
+import logging
+import random
+import threading
+
+from . import Mip
+
+
+class _Characteristic(object):
+
+  def __init__(self, uuid):
+    self.uuid = uuid
+    self.value = ''
+
+
+class VirtualMip(object):
+
+  def __init__(self, name='WowWee-MiP-Sim'):
+    self.log = logging.getLogger('Simulator')
+    self.name = name
+    self.uuid = name
+    self.manager = None
+    self.peer = None
+    self.writeErrors = 0.0
+    self.ackErrors = 0.0
+    self.rssi = -60
+    self.lock = threading.RLock()
+    self.commands = []
+    self.chestLed = [0, 0xff, 0]
+    self.headLed = [1, 1, 1, 1]   #l4 to l1, the byte order of 0x8A and 0x8B
+    self.volume = 7
+    self.radarMode = 0
+    self.gameMode = 1
+    self.irReceive = 0
+    self.odometer = 0
+    self.memory = [0]*16
+    self.read_c = _Characteristic('FFE4')
+    self.write_c = _Characteristic('FFE9')
+
+  def attach(self, manager):
+    '''
+    attach(manager)
+    Connect a _Manager to the stand-in robot
+    '''
+    self.manager = manager
+    manager.peripheral = self
+    manager.read_c = self.read_c
+    manager.write_c = self.write_c
+    manager.ready = True
+
+  def link(self, other):
+    '''
+    link(other)
+    Deliver the IR codes of each robot to the other one
+    '''
+    self.peer = other
+    other.peer = self
+
+  def notify(self, values):
+    '''
+    notify(values)
+    Send a notification, [opcode, data...]
+    '''
+    with self.lock:
+      self.read_c.value = binascii.hexlify(bytes(bytearray(values))).upper()
+      self.manager.did_update_value(self.read_c, None)
+
+  def set_notify_value(self, c, flag=True):
+    pass
+
+  def read_rssi(self):
+    self.manager.did_read_rssi(self, self.rssi, None)
+
+  def write_characteristic_value(self, c, data, with_response):
+    values = list(bytearray(data))
+    if random.random()<self.writeErrors:
+      self.log.info('command %s lost', map(hex, values))
+      if with_response:
+        self.manager.did_write_value(c, 'simulated write error')
+      return
+    self.commands.append((self.manager.clock.time(), values))
+    self.log.info('command %s', map(hex, values))
+    response = self._execute(values[0], values[1:])
+    if with_response and random.random()<self.ackErrors:
+      self.log.info('confirmation of %s lost', map(hex, values))
+    elif with_response:
+      self.manager.did_write_value(c, None)
+    if response is not None:
+      self.notify(response)
+
+  def _execute(self, op, args):
+    if op == 0x84:
+      self.chestLed = args[:3]
+    elif op == 0x89:
+      self.chestLed = args[:3]
+    elif op == 0x8A:
+      self.headLed = args[:4]
+    elif op == 0x15:
+      self.volume = args[0]
+    elif op == 0x0C:
+      self.radarMode = args[0]
+    elif op == 0x76:
+      self.gameMode = args[0]
+    elif op == 0x10:
+      self.irReceive = args[0]
+    elif op == 0x12:
+      self.memory[args[0]-0x20] = args[1]
+    elif op == 0x70:
+      self.odometer += int(args[1]*48.5)
+    elif op in (0x71, 0x72):
+      self.odometer += int(args[0]*args[1]*0.7)
+    elif op == 0x8C:
+      if self.peer and self.peer.irReceive:
+        self.peer.notify([0x03]+args[:4])
+    #------- reads --------
+    elif op == 0x82:
+      return [0x82, self.gameMode]
+    elif op == 0x83:
+      return [0x83]+self.chestLed
+    elif op == 0x8B:
+      return [0x8B]+self.headLed
+    elif op == 0x85:
+      o = self.odometer
+      return [0x85, o>>24&0xff, o>>16&0xff, o>>8&0xff, o&0xff]
+    elif op == 0x0D:
+      return [0x0D, self.radarMode]
+    elif op == 0x11:
+      return [0x11, self.irReceive]
+    elif op == 0x13:
+      return [0x13, args[0], self.memory[args[0]-0x20]]
+    elif op == 0x14:
+      return [0x14, 15, 3, 2, 1]
+    elif op == 0x19:
+      return [0x19, 1, 1]
+    elif op == 0x16:
+      return [0x16, self.volume]
+    elif op == 0x1F:
+      return [0x1F, 0, 0, 0]
+
+
+def start(virtual=True, manager=None):
+  '''
+  start(virtual=True, manager=None)
+  Attach a VirtualMip to the manager, Mip._manager by default, and with
+  virtual use a Mip.VirtualClock
+  Return: the VirtualMip, its clock is sim.clock
+  '''
+  manager = manager or Mip._manager
+  if virtual:
+    manager.clock = Mip.VirtualClock()
+  sim = VirtualMip()
+  sim.attach(manager)
+  sim.clock = manager.clock
+  return sim
+
+def stop(sim):
+  '''
+  stop(sim)
+  Detach the VirtualMip and restore the real time clock
+  '''
+  manager = sim.manager
+  manager.ready = False
+  manager.peripheral = None
+  manager.read_c = None
+  manager.write_c = None
+  manager.clock = Mip.Clock()
+  if manager.filter:
+    manager.filter.clock = manager.clock
@@ -0,0 +1,225 @@
+# coding: utf-8
+"""
+WowWeeMip telemetry log, columnar files of the MiP notifications
+_________________________________________
+use:
+from WowWeeMip import Mip, Telemetry
+
+log = Telemetry.Writer('mip-log')
+log.attach(Mip._manager, 'mip1')
+...
+log.close()
+
+reader = Telemetry.Reader('mip-log')
+radar = reader.read('radar', start=t0, end=t1)   # {'time':array, 'robot':array, 'value':array}
+reader.label('radar', 'value', radar['value'])     # ['clear', '30cm', ...]
+
+_________________________________________
+Every event type has one file per column, <event>.<column>, holding
+fixed width little endian values. The notifications are taken before
+the event filter, buffered and appended in batches by the writer
+thread. The reader maps the files in memory and slices a time range with a binary search on the
+time column, nothing is parsed.
+"""
+
+import os
+import mmap
+import struct
+import threading
+import time
+import logging
+
+import numpy as np
+
+from . import Mip
+
+
+def _codes(names):
+  return dict((v, k) for k, v in names.items())
+
+#event: [(column, struct format, data key, value -> code)]
+schema = {
+  'status': [('battery', 'h', 'battery', None), ('position', 'B', 'position', _codes(Mip._Manager.position))],
+  'weight': [('deg', 'h', 'deg', None)],
+  'odometer': [('meters', 'd', 'meters', None)],
+  'radar': [('value', 'B', 'value', _codes(Mip._Manager.value))],
+  'gesture': [('gesture', 'B', 'gesture', _codes(Mip._Manager.gesture))],
+  'clap': [('clap', 'B', 'clap', None)],
+  'shake': [],
+}
+common = [('time', 'd'), ('robot', 'B')]
+
+
+def _columns(event):
+  return common+[(c[0], c[1]) for c in schema[event]]
+
+
+class Writer(object):
+
+  def __init__(self, path, batch=512, interval=1.0):
+    self.log = logging.getLogger('Telemetry')
+    self.path = path
+    self.batch = batch
+    self.interval = interval
+    if not os.path.isdir(path):
+      os.makedirs(path)
+    self.robots = Reader._robots(path)
+    self.buffer = []
+    self.cv = threading.Condition()
+    self.taps = []
+    self.running = True
+    self.counters = dict.fromkeys(['events', 'written', 'flushes'], 0)
+    self.thread = threading.Thread(target=self._run, args=())
+    self.thread.daemon = True
+    self.thread.start()
+
+  def attach(self, manager=None, robot='mip'):
+    '''
+    attach(manager=None, robot='mip')
+    Log the notifications of a _Manager, Mip._manager by default
+    '''
+    manager = manager or Mip._manager
+    with self.cv:
+      if robot not in self.robots:
+        if len(self.robots)>255:
+          raise ValueError('at most 256 robots per log')
+        self.robots.append(robot)
+        with open(os.path.join(self.path, 'robots.txt'), 'a') as f:
+          f.write(robot+'\n')
+      index = self.robots.index(robot)
+    #tapped before the event filter, so repeated radar and gesture values are logged too
+    tap = lambda event, data: self.on_event(index, event, data, manager.clock.time())
+    manager.addTap(tap)
+    self.taps.append((manager, tap))
+
+  def on_event(self, robot, event, data, t=None):
+    if event in schema:
+      with self.cv:
+        self.buffer.append((time.time() if t is None else t, robot, event, data))
+        self.counters['events'] += 1
+        if len(self.buffer)>=self.batch:
+          self.cv.notifyAll()
+    return False
+
+  def close(self):
+    '''
+    close()
+    Detach from the managers and write the buffered events
+    '''
+    for manager, tap in self.taps:
+      manager.removeTap(tap)
+    self.taps = []
+    with self.cv:
+      self.running = False
+      self.cv.notifyAll()
+    self.thread.join()
+
+  def stats(self):
+    with self.cv:
+      s = dict(self.counters)
+      s['buffered'] = len(self.buffer)
+    return s
+
+  def _run(self):
+    while True:
+      with self.cv:
+        if self.running and len(self.buffer)<self.batch:
+          self.cv.wait(self.interval)
+        batch = self.buffer
+        self.buffer = []
+        running = self.running
+      if batch:
+        self._write(batch)
+      if not running:
+        break
+
+  def _write(self, batch):
+    rows = {}
+    for t, robot, event, data in batch:
+      try:
+        row = [t, robot]
+        for column, fmt, key, codes in schema[event]:
+          row.append(codes[data[key]] if codes else data[key])
+      except (KeyError, TypeError) as err:
+        self.log.warning('%s %s not logged: %s', event, data, err)
+        continue
+      rows.setdefault(event, []).append(row)
+    for event, values in rows.items():
+      for i, (column, fmt) in enumerate(_columns(event)):
+        with open(os.path.join(self.path, '%s.%s' % (event, column)), 'ab') as f:
+          f.write(struct.pack('<%d%s' % (len(values), fmt), *[v[i] for v in values]))
+    with self.cv:
+      self.counters['written'] += sum(len(v) for v in rows.values())
+      self.counters['flushes'] += 1
+
+
+class Reader(object):
+
+  def __init__(self, path):
+    self.path = path
+    self.robots = Reader._robots(path)
+    self.maps = {}
+
+  @staticmethod
+  def _robots(path):
+    try:
+      with open(os.path.join(path, 'robots.txt')) as f:
+        return [line.rstrip('\n') for line in f]
+    except IOError:
+      return []
+
+  def events(self):
+    '''
+    events()
+    Return: dictionary {event: number of records}
+    '''
+    return dict((event, self._length(event)) for event in schema if self._length(event))
+
+  def _map(self, event, column, fmt):
+    name = os.path.join(self.path, '%s.%s' % (event, column))
+    size = os.path.getsize(name) if os.path.exists(name) else 0
+    cached = self.maps.get(name)
+    if cached is None or cached[0] != size:
+      if size == 0:
+        array = np.zeros(0, '<'+fmt)
+      else:
+        with open(name, 'rb') as f:
+          m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        array = np.frombuffer(m, '<'+fmt, size//struct.calcsize(fmt))
+      cached = (size, array)
+      self.maps[name] = cached
+    return cached[1]
+
+  def _length(self, event):
+    #columns can differ while the writer is appending, the shortest wins
+    return min(len(self._map(event, c, f)) for c, f in _columns(event))
+
+  def read(self, event, start=None, end=None, robot=None):
+    '''
+    read(event, start=None, end=None, robot=None)
+    Records with start <= time < end, the arrays are views of the
+    mapped files
+    Return: dictionary {column: numpy array}
+    '''
+    n = self._length(event)
+    times = self._map(event, 'time', 'd')[:n]
+    lo = 0 if start is None else int(np.searchsorted(times, start, 'left'))
+    hi = n if end is None else int(np.searchsorted(times, end, 'left'))
+    r = dict((c, self._map(event, c, f)[lo:hi]) for c, f in _columns(event))
+    if robot is not None:
+      mask = r['robot'] == self.robots.index(robot)
+      r = dict((c, a[mask]) for c, a in r.items())
+    return r
+
+  def label(self, event, column, codes):
+    '''
+    label(event, column, codes)
+    Return: list of the names of coded values, robot indexes included
+    '''
+    if column == 'robot':
+      return [self.robots[i] for i in codes]
+    for c, fmt, key, names in schema[event]:
+      if c == column and names:
+        names = _codes(names)
+        return [names[int(v)] for v in codes]
+    return list(codes)
@@ -0,0 +1,123 @@
+# coding: utf-8
+"""
+IrLink between two linked Simulator.VirtualMip robots on one VirtualClock
+
+run: python -m unittest discover -s tests -t .
+"""
+
+import sys
+import types
+import random
+import unittest
+
+try:
+  import cb
+except ImportError:
+  #cb only exists in Pythonista, the simulated robots do not use it
+  sys.modules['cb'] = types.ModuleType('cb')
+
+from WowWeeMip import Mip, IrLink, Simulator
+
+
+class IrLinkTest(unittest.TestCase):
+
+  def setUp(self):
+    random.seed(7)
+    self.clock = Mip.VirtualClock()
+    self.received = []
+    self.managers = [Mip._Manager(lambda event, data: None) for i in range(2)]
+    self.sims = [Simulator.start(False, m) for m in self.managers]
+    for m in self.managers:
+      m.clock = self.clock
+    self.sims[0].link(self.sims[1])
+    self.sender = IrLink.IrLink(manager=self.managers[0], window=4)
+    self.receiver = IrLink.IrLink(self.received.append, manager=self.managers[1], window=4)
+    self.sender.start()
+    self.receiver.start()
+
+  def tearDown(self):
+    self.sender.stop()
+    self.receiver.stop()
+
+  def frames(self):
+    #fragments written by the sender, once each even when sent again
+    frames = []
+    for t, values in self.sims[0].commands:
+      if values[0] == 0x8C and values[1]>>6 in (IrLink.START, IrLink.CONT) and values[1:5] not in frames:
+        frames.append(values[1:5])
+    return frames
+
+  def test_fragmentation(self):
+    data = range(10)
+    self.sender.send(data)
+    self.assertTrue(self.sender.flush(60))
+    frames = self.frames()
+    #length byte and 10 bytes in 3 byte fragments
+    self.assertEqual(len(frames), 4)
+    self.assertEqual([f[0]>>6 for f in frames], [IrLink.START]+[IrLink.CONT]*3)
+    self.assertEqual(frames[0][1], 10)
+    self.assertEqual(sum([f[1:] for f in frames], [])[1:11], data)
+    self.assertEqual(self.received, [data])
+
+  def test_lossy_link(self):
+    for sim in self.sims:
+      sim.writeErrors = 0.3
+    messages = [[random.randint(0, 255) for i in range(random.randint(0, 40))] for j in range(10)]
+    for data in messages:
+      self.sender.send(data)
+    self.assertTrue(self.sender.flush(3600))
+    #every message once and in order despite the lost frames and acks
+    self.assertEqual(self.received, messages)
+    sent = self.sender.stats()
+    received = self.receiver.stats()
+    self.assertEqual(sent['messagesSent'], 10)
+    self.assertEqual(sent['messagesDelivered'], 10)
+    self.assertEqual(sent['bytesDelivered'], sum(len(m) for m in messages))
+    self.assertEqual(received['messagesReceived'], 10)
+    self.assertEqual(received['bytesReceived'], sum(len(m) for m in messages))
+    self.assertTrue(sent['framesRetransmitted']>0)
+    self.assertTrue(received['duplicates']>0)
+    self.assertTrue(0<sent['loss']<1)
+    self.assertEqual(sent['inflight'], 0)
+    self.assertEqual(sent['queued'], 0)
+
+  def test_repeatable(self):
+    #the links run in the thread moving the virtual clock, a run replays exactly
+    runs = []
+    for run in range(2):
+      if run:
+        self.tearDown()
+        self.setUp()
+      for sim in self.sims:
+        sim.writeErrors = 0.3
+      for data in [[i]*i for i in range(12)]:
+        self.sender.send(data)
+      self.assertTrue(self.sender.flush(3600))
+      runs.append((self.received, self.sender.stats(), self.receiver.stats(), self.clock.time()))
+    self.assertEqual(runs[0], runs[1])
+
+  def test_duplicate_frame(self):
+    self.sender.send([1, 2])
+    self.assertTrue(self.sender.flush(60))
+    duplicates = self.receiver.stats()['duplicates']
+    #the same frame again, as when its ack was lost
+    self.sims[1].notify([0x03]+self.frames()[0])
+    self.assertEqual(self.received, [[1, 2]])
+    self.assertEqual(self.receiver.stats()['duplicates'], duplicates+1)
+    self.sender.send([3])
+    self.assertTrue(self.sender.flush(60))
+    self.assertEqual(self.received, [[1, 2], [3]])
+
+  def test_sender_restart(self):
+    self.sender.send([1, 2, 3])
+    self.assertTrue(self.sender.flush(60))
+    self.sender.stop()
+    self.sender.start()
+    self.sender.send([9, 9, 9])
+    self.assertTrue(self.sender.flush(60))
+    self.assertEqual(self.received, [[1, 2, 3], [9, 9, 9]])
+    self.assertEqual(self.receiver.stats()['sessions'], 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
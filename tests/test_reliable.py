@@ -0,0 +1,74 @@
+# coding: utf-8
+"""
+Reliable writes to a Simulator.VirtualMip on a VirtualClock
+
+run: python -m unittest discover -s tests -t .
+"""
+
+import sys
+import types
+import unittest
+
+try:
+  import cb
+except ImportError:
+  #cb only exists in Pythonista, the simulated robots do not use it
+  sys.modules['cb'] = types.ModuleType('cb')
+
+from WowWeeMip import Mip, Simulator
+
+
+class ReliableTest(unittest.TestCase):
+
+  def setUp(self):
+    self.manager = Mip._Manager(lambda event, data: None)
+    self.sim = Simulator.start(True, self.manager)
+
+  def tearDown(self):
+    Simulator.stop(self.sim)
+
+  def writes(self):
+    return [values for t, values in self.sim.commands if values == [0x77]]
+
+  def test_delivered(self):
+    w = self.manager.sendReliable([0x77])
+    self.assertTrue(w.wait(0))
+    self.assertEqual(w.tries, 1)
+    self.assertEqual(self.manager.writeStats, {'delivered':1, 'failed':0, 'retransmitted':0})
+
+  def test_lost_completion(self):
+    #the robot gets the write but its confirmation never comes back
+    self.sim.ackErrors = 1.0
+    w = self.manager.sendReliable([0x77])
+    self.assertEqual(w.wait(0), None)
+    self.sim.ackErrors = 0.0
+    self.sim.clock.advance(self.manager.writeTimeout)
+    self.assertTrue(w.wait(0))
+    self.assertEqual(w.tries, 2)
+    #the later writes are matched to their own completions
+    writes = [self.manager.sendReliable([0x77]) for i in range(6)]
+    self.assertEqual([x.wait(0) for x in writes], [True]*6)
+    self.assertEqual([x.tries for x in writes], [1]*6)
+    self.assertEqual(len(self.manager.outstanding), 0)
+    self.assertEqual(len(self.writes()), 8)
+
+  def test_failed_write_placeholder(self):
+    #a write failed for good leaves a placeholder, the next timeout clears it
+    self.manager.retries = 0
+    self.sim.ackErrors = 1.0
+    w = self.manager.sendReliable([0x77])
+    self.sim.clock.advance(self.manager.writeTimeout)
+    self.assertEqual(w.wait(0), False)
+    self.sim.ackErrors = 0.0
+    self.manager.retries = 3
+    x = self.manager.sendReliable([0x77])
+    self.sim.clock.advance(self.manager.writeTimeout)
+    self.assertTrue(x.wait(0))
+    y = self.manager.sendReliable([0x77])
+    self.assertTrue(y.wait(0))
+    self.assertEqual(y.tries, 1)
+    self.assertEqual(len(self.manager.outstanding), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()